@@ -1,24 +1,284 @@
+import os
+import time
+
 import cv2
 import mediapipe as mp
 import numpy as np
+from numba import njit
 from utils.logger import Logger
-from sensors.eyes.camera_input import CameraInput
+from sensors.eyes.camera_input import LatestFrame, get_camera_input, get_frame_display
 from utils.async_task_manager import AsyncTaskManager
 
+try:
+    import tflite_runtime.interpreter as tflite
+except ImportError:
+    # Fall back to the interpreter bundled with the full TensorFlow install
+    from tensorflow import lite as tflite
+
 # Initialize logger for body language analysis
 logger = Logger(name="BodyLanguageAnalysis")
 
+POSE_MODEL_PATH = os.path.join(os.path.dirname(__file__), "pose_landmark_full_int8.tflite")
+
+# BlazePose landmark indices used by the posture checks
+NUM_POSE_LANDMARKS = 33
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_ELBOW, RIGHT_ELBOW = 13, 14
+LEFT_WRIST, RIGHT_WRIST = 15, 16
+
+# Bit flags returned by classify_pose
+ARMS_RAISED = 1 << 0
+ARMS_CROSSED = 1 << 1
+SHOULDERS_TILTED = 1 << 2
+
+
+@njit(cache=True, fastmath=True)
+def classify_pose(soa):
+    """
+    Evaluate every posture check in one native call.
+
+    Parameters:
+    - soa: (3, NUM_POSE_LANDMARKS) struct-of-arrays buffer with x, y and z rows of
+      normalized landmark coordinates.
+
+    Returns:
+    - int: Bitmask of ARMS_RAISED, ARMS_CROSSED and SHOULDERS_TILTED.
+    """
+    x = soa[0]
+    y = soa[1]
+    flags = 0
+
+    # Wrists above shoulders (y-coordinate in image, smaller is higher)
+    if y[LEFT_WRIST] < y[LEFT_SHOULDER] and y[RIGHT_WRIST] < y[RIGHT_SHOULDER]:
+        flags |= ARMS_RAISED
+
+    # Wrists positioned in front of the chest (crossing over)
+    if x[LEFT_WRIST] > x[RIGHT_ELBOW] and x[RIGHT_WRIST] < x[LEFT_ELBOW]:
+        flags |= ARMS_CROSSED
+
+    # Significant difference between the shoulders' y-coordinates
+    if abs(y[LEFT_SHOULDER] - y[RIGHT_SHOULDER]) > 0.1:
+        flags |= SHOULDERS_TILTED
+
+    return flags
+
+
+try:
+    # Prefer the compiled Cython classifier when it has been built (cythonize -i pose_geom.pyx)
+    from brain.sensory_inputs.visual.pose_geom import classify as classify_pose
+except ImportError:
+    pass  # Keep the Numba kernel above
+
+DEFAULT_SHOULDER_TILT_THRESHOLD = 0.1
+
+# Straight-line rule set specialized at startup; {..._x}/{..._y} are flat offsets into soa.ravel()
+_RULES_TEMPLATE = """
+def _classify(lm):
+    flags = 0
+    if lm[{lw_y}] < lm[{ls_y}] and lm[{rw_y}] < lm[{rs_y}]:
+        flags |= {arms_raised}
+    if lm[{lw_x}] > lm[{re_x}] and lm[{rw_x}] < lm[{le_x}]:
+        flags |= {arms_crossed}
+    if abs(lm[{ls_y}] - lm[{rs_y}]) > {tilt_threshold!r}:
+        flags |= {shoulders_tilted}
+    return flags
+"""
+
+
+def build_pose_classifier(shoulder_tilt_threshold=DEFAULT_SHOULDER_TILT_THRESHOLD):
+    """
+    Return the posture classifier for a deployment's thresholds.
+
+    The compiled kernel is used for the default rule set; any other thresholds are folded
+    as constants into a generated function that takes the flattened SoA buffer.
+
+    Parameters:
+    - shoulder_tilt_threshold: Minimum shoulder height difference counted as a tilt.
+
+    Returns:
+    - callable: Function mapping the (3, NUM_POSE_LANDMARKS) SoA buffer to a flag bitmask.
+    """
+    if shoulder_tilt_threshold == DEFAULT_SHOULDER_TILT_THRESHOLD:
+        return classify_pose
+
+    source = _RULES_TEMPLATE.format(
+        lw_x=LEFT_WRIST, rw_x=RIGHT_WRIST, le_x=LEFT_ELBOW, re_x=RIGHT_ELBOW,
+        lw_y=NUM_POSE_LANDMARKS + LEFT_WRIST, rw_y=NUM_POSE_LANDMARKS + RIGHT_WRIST,
+        ls_y=NUM_POSE_LANDMARKS + LEFT_SHOULDER, rs_y=NUM_POSE_LANDMARKS + RIGHT_SHOULDER,
+        tilt_threshold=float(shoulder_tilt_threshold),
+        arms_raised=ARMS_RAISED, arms_crossed=ARMS_CROSSED, shoulders_tilted=SHOULDERS_TILTED,
+    )
+    namespace = {}
+    exec(compile(source, "<pose_rules>", "exec"), namespace)
+    generated = namespace["_classify"]
+    return lambda soa: generated(soa.ravel())
+
+
+class PoseBackend:
+    def __init__(self, model_path=POSE_MODEL_PATH, input_size=256, presence_threshold=0.5, num_threads=None):
+        """
+        Load the INT8-quantized BlazePose landmark model into a TFLite interpreter.
+
+        Parameters:
+        - model_path: Path to the pre-exported INT8 pose landmark model.
+        - input_size: Square input resolution expected by the model.
+        - presence_threshold: Minimum pose presence score for landmarks to be returned.
+        - num_threads: Interpreter threads (defaults to the number of CPU cores).
+        """
+        if not os.path.exists(model_path):
+            logger.error(f"Pose landmark model not found at {model_path}.")
+            raise FileNotFoundError("Luna cannot read body language - pose model is missing.")
+
+        self.interpreter = tflite.Interpreter(model_path=model_path, num_threads=num_threads or os.cpu_count())
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()[0]
+        self.output_details = self.interpreter.get_output_details()
+        self.input_size = input_size
+        self.presence_threshold = presence_threshold
+
+        # Reusable preprocessing buffers so the per-frame path does not allocate
+        self._resized = np.empty((input_size, input_size, 3), dtype=np.uint8)
+        self._rgb = np.empty((input_size, input_size, 3), dtype=np.uint8)
+        self._input = np.empty((1, input_size, input_size, 3), dtype=self.input_details['dtype'])
+        self._quantized = self.input_details['dtype'] != np.float32
+        if self._quantized:
+            self._scratch = np.empty((input_size, input_size, 3), dtype=np.float32)
+
+    def _preprocess(self, frame):
+        """
+        Resize and convert a BGR frame into the interpreter's input tensor in place.
+        """
+        cv2.resize(frame, (self.input_size, self.input_size), dst=self._resized)
+        cv2.cvtColor(self._resized, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        if self._quantized:
+            scale, zero_point = self.input_details['quantization']
+            np.multiply(self._rgb, 1.0 / (255.0 * scale), out=self._scratch)
+            np.add(self._scratch, zero_point, out=self._scratch)
+            self._input[0] = self._scratch
+        else:
+            np.multiply(self._rgb, 1.0 / 255.0, out=self._input[0])
+        return self._input
+
+    def _output(self, index):
+        """
+        Read an output tensor, dequantizing it if the model emits integers.
+        """
+        details = self.output_details[index]
+        tensor = self.interpreter.get_tensor(details['index'])
+        if tensor.dtype != np.float32:
+            scale, zero_point = details['quantization']
+            tensor = (tensor.astype(np.float32) - zero_point) * scale
+        return tensor
+
+    def process(self, frame):
+        """
+        Run the pose landmark model on a BGR frame.
+
+        Parameters:
+        - frame: BGR frame captured from the camera.
+
+        Returns:
+        - numpy.ndarray: (num_landmarks, 5) array of x, y, z, visibility, presence with
+          x/y normalized to [0, 1], or None if no pose is present.
+        """
+        self.interpreter.set_tensor(self.input_details['index'], self._preprocess(frame))
+        self.interpreter.invoke()
+
+        presence = 1.0 / (1.0 + np.exp(-float(self._output(1).ravel()[0])))
+        if presence < self.presence_threshold:
+            return None
+
+        landmarks = self._output(0).reshape(-1, 5)
+        landmarks[:, :2] /= self.input_size
+        return landmarks
+
+
+class OneEuroFilter:
+    def __init__(self, min_cutoff=1.0, beta=0.007, d_cutoff=1.0):
+        """
+        One Euro low-pass filter applied element-wise to an array of landmark coordinates.
+
+        Parameters:
+        - min_cutoff: Minimum cutoff frequency (Hz); lower values smooth more at rest.
+        - beta: Speed coefficient; higher values reduce lag during fast motion.
+        - d_cutoff: Cutoff frequency (Hz) for the derivative estimate.
+        """
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        """
+        Forget the filter state, e.g. after the tracked pose is lost.
+        """
+        self._x_prev = None
+        self._dx_prev = None
+        self._t_prev = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * np.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, x, timestamp):
+        """
+        Filter a new sample.
+
+        Parameters:
+        - x: numpy.ndarray of raw values.
+        - timestamp: Sample time in seconds.
+
+        Returns:
+        - numpy.ndarray: The smoothed values.
+        """
+        if self._x_prev is None:
+            self._x_prev = x.copy()
+            self._dx_prev = np.zeros_like(x)
+            self._t_prev = timestamp
+            return x
+
+        dt = max(timestamp - self._t_prev, 1e-3)
+        dx = (x - self._x_prev) / dt
+        alpha_d = self._alpha(self.d_cutoff, dt)
+        dx_hat = alpha_d * dx + (1 - alpha_d) * self._dx_prev
+
+        alpha = self._alpha(self.min_cutoff + self.beta * np.abs(dx_hat), dt)
+        x_hat = alpha * x + (1 - alpha) * self._x_prev
+
+        self._x_prev = x_hat
+        self._dx_prev = dx_hat
+        self._t_prev = timestamp
+        return x_hat
+
+
 class BodyLanguageAnalysis:
-    def __init__(self):
+    def __init__(self, detect_every=3, shoulder_tilt_threshold=DEFAULT_SHOULDER_TILT_THRESHOLD):
         """
-        Initialize MediaPipe Pose module, camera input, and async task manager.
+        Initialize the quantized pose backend, camera input, and async task manager.
+
+        Parameters:
+        - detect_every: Run the pose model once every this many frames and extrapolate in between.
+        - shoulder_tilt_threshold: Deployment-specific threshold for the shoulders tilted check.
         """
         self.mp_pose = mp.solutions.pose
-        self.pose_drawing_spec = mp.solutions.drawing_utils.DrawingSpec(thickness=2, circle_radius=2)
-        self.pose = self.mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
-        self.cap = CameraInput()  # Custom CameraInput class for video stream capture
+        self.pose = PoseBackend()
+        self.cap = get_camera_input()  # Shared CameraInput for video stream capture
         self.logger = logger
 
+        # Skip-frame tracking state
+        self._detect_every = detect_every
+        self._frame_idx = 0
+        self._last_detection = None
+        self._last_detection_time = None
+        self._landmark_velocity = None
+        self._landmark_filter = OneEuroFilter()
+
+        # Struct-of-arrays (x, y, z rows) copy of the current landmarks for the posture checks
+        self._soa = np.empty((3, NUM_POSE_LANDMARKS), dtype=np.float32)
+        self._classify = build_pose_classifier(shoulder_tilt_threshold)
+        self._last_posture = None  # Posture message last reported by analyze_pose_landmarks
+
         # Initialize AsyncTaskManager for real-time body language detection
         self.task_manager = AsyncTaskManager(max_workers=2)
         self.task_manager.start()
@@ -43,63 +303,123 @@ class BodyLanguageAnalysis:
         Detect body language patterns in real-time using camera input.
         Uses MediaPipe Pose to extract pose landmarks and determine specific gestures or postures.
         """
+        latest_frame = LatestFrame()
+        window_closed = get_frame_display().register('Body Language Analysis', latest_frame)
+
         try:
-            while True:
+            while not window_closed.is_set():
                 # Capture frame from the camera
-                frame = self.cap.capture_frame()
+                frame, inference_frame, _ = self.cap.capture_frame_for_inference()
                 if frame is None:
                     self.logger.error("No frame captured from the camera.")
                     continue
 
-                # Convert the image to RGB as required by MediaPipe
-                image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-                # Process the image and detect pose landmarks
-                results = self.pose.process(image_rgb)
+                # Detect (or extrapolate) pose landmarks for this frame
+                landmarks = self.estimate_landmarks(inference_frame)
 
                 # Check if pose landmarks are detected
-                if results.pose_landmarks:
+                if landmarks is not None:
                     # Analyze landmarks for specific body language patterns
-                    self.analyze_pose_landmarks(results.pose_landmarks)
-
-                    # Draw pose landmarks on the image for visualization
-                    mp.solutions.drawing_utils.draw_landmarks(
-                        frame, 
-                        results.pose_landmarks, 
-                        self.mp_pose.POSE_CONNECTIONS, 
-                        self.pose_drawing_spec
-                    )
+                    self.analyze_pose_landmarks(landmarks)
 
-                # Display the frame (can be omitted in a headless setup)
-                cv2.imshow('Body Language Analysis', frame)
+                    # Draw pose landmarks on a copy of the shared frame for visualization
+                    frame = frame.copy()
+                    self.draw_landmarks(frame, landmarks)
 
-                # Break the loop if 'q' key is pressed
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+                # Hand the frame to the display thread (can be omitted in a headless setup)
+                latest_frame.set(frame)
 
         except Exception as e:
             self.logger.error(f"An error occurred during body language detection: {e}")
         finally:
             # Release resources
-            self.cap.release()
-            cv2.destroyAllWindows()
+            get_frame_display().unregister('Body Language Analysis')
+
+    def estimate_landmarks(self, frame):
+        """
+        Run the pose model every `detect_every` frames and extrapolate landmarks in between
+        from the motion between the last two detections, smoothing the result with a One Euro filter.
+
+        Parameters:
+        - frame: BGR frame captured from the camera.
+
+        Returns:
+        - numpy.ndarray: Landmark array for this frame, or None if no pose is tracked.
+        """
+        now = time.monotonic()
+        run_detector = self._last_detection is None or self._frame_idx % self._detect_every == 0
+        self._frame_idx += 1
+
+        if run_detector:
+            detection = self.pose.process(frame)
+            if detection is None:
+                self._last_detection = None
+                self._landmark_velocity = None
+                self._landmark_filter.reset()
+                return None
+
+            if self._last_detection is not None:
+                elapsed = max(now - self._last_detection_time, 1e-3)
+                self._landmark_velocity = (detection - self._last_detection) / elapsed
+            self._last_detection = detection
+            self._last_detection_time = now
+            landmarks = detection
+        elif self._landmark_velocity is not None:
+            landmarks = self._last_detection + self._landmark_velocity * (now - self._last_detection_time)
+        else:
+            landmarks = self._last_detection
+
+        return self._landmark_filter(landmarks, now)
+
+    def draw_landmarks(self, frame, landmarks):
+        """
+        Draw pose landmarks and their connections onto the frame.
+
+        Parameters:
+        - frame: The BGR frame to draw on.
+        - landmarks: (num_landmarks, 5) landmark array returned by the pose backend.
+        """
+        height, width = frame.shape[:2]
+        points = (landmarks[:, :2] * (width, height)).astype(np.int32).tolist()
+        for start, end in self.mp_pose.POSE_CONNECTIONS:
+            cv2.line(frame, tuple(points[start]), tuple(points[end]), (255, 255, 255), 2)
+        for point in points[:len(self.mp_pose.PoseLandmark)]:
+            cv2.circle(frame, tuple(point), 2, (0, 0, 255), 2)
+
+    def _load_soa(self, landmarks):
+        """
+        Copy the x, y, z landmark columns into the preallocated struct-of-arrays buffer.
+
+        Parameters:
+        - landmarks: (num_landmarks, 5) landmark array returned by the pose backend.
+
+        Returns:
+        - numpy.ndarray: The (3, NUM_POSE_LANDMARKS) buffer.
+        """
+        np.copyto(self._soa, landmarks[:NUM_POSE_LANDMARKS, :3].T, casting='same_kind')
+        return self._soa
 
     def analyze_pose_landmarks(self, landmarks):
         """
         Analyze pose landmarks to detect specific body language patterns.
+        A posture is reported when it changes, so a held posture is logged once rather than on every frame.
         
         Parameters:
-        - landmarks: Pose landmarks detected by MediaPipe.
+        - landmarks: (num_landmarks, 5) landmark array returned by the pose backend.
         """
         try:
-            if self.are_arms_raised(landmarks):
-                self.logger.info("Arms raised detected.")
-            elif self.are_arms_crossed(landmarks):
-                self.logger.info("Arms crossed detected.")
-            elif self.are_shoulders_tilted(landmarks):
-                self.logger.info("Shoulders tilted detected.")
+            flags = self._classify(self._load_soa(landmarks))
+            if flags & ARMS_RAISED:
+                posture = "Arms raised detected."
+            elif flags & ARMS_CROSSED:
+                posture = "Arms crossed detected."
+            elif flags & SHOULDERS_TILTED:
+                posture = "Shoulders tilted detected."
             else:
-                self.logger.info("No specific body language pattern detected.")
+                posture = "No specific body language pattern detected."
+            if posture != self._last_posture:
+                self._last_posture = posture
+                self.logger.info(posture)
         except Exception as e:
             self.logger.error(f"Error analyzing pose landmarks: {e}")
 
@@ -108,19 +428,13 @@ class BodyLanguageAnalysis:
         Determine if the arms are raised above the head based on pose landmarks.
         
         Parameters:
-        - landmarks: Pose landmarks detected by MediaPipe.
+        - landmarks: (num_landmarks, 5) landmark array returned by the pose backend.
         
         Returns:
         - bool: True if arms are raised, False otherwise.
         """
         try:
-            left_shoulder = landmarks.landmark[self.mp_pose.PoseLandmark.LEFT_SHOULDER]
-            left_wrist = landmarks.landmark[self.mp_pose.PoseLandmark.LEFT_WRIST]
-            right_shoulder = landmarks.landmark[self.mp_pose.PoseLandmark.RIGHT_SHOULDER]
-            right_wrist = landmarks.landmark[self.mp_pose.PoseLandmark.RIGHT_WRIST]
-
-            # Check if wrists are above shoulders (y-coordinate in image, smaller is higher)
-            return left_wrist.y < left_shoulder.y and right_wrist.y < right_shoulder.y
+            return bool(self._classify(self._load_soa(landmarks)) & ARMS_RAISED)
         except Exception as e:
             self.logger.error(f"Error detecting arms raised: {e}")
             return False
@@ -130,19 +444,13 @@ class BodyLanguageAnalysis:
         Determine if arms are crossed in front of the body based on pose landmarks.
         
         Parameters:
-        - landmarks: Pose landmarks detected by MediaPipe.
+        - landmarks: (num_landmarks, 5) landmark array returned by the pose backend.
         
         Returns:
         - bool: True if arms are crossed, False otherwise.
         """
         try:
-            left_wrist = landmarks.landmark[self.mp_pose.PoseLandmark.LEFT_WRIST]
-            right_wrist = landmarks.landmark[self.mp_pose.PoseLandmark.RIGHT_WRIST]
-            left_elbow = landmarks.landmark[self.mp_pose.PoseLandmark.LEFT_ELBOW]
-            right_elbow = landmarks.landmark[self.mp_pose.PoseLandmark.RIGHT_ELBOW]
-
-            # Check if wrists are positioned in front of the chest (crossing over)
-            return left_wrist.x > right_elbow.x and right_wrist.x < left_elbow.x
+            return bool(self._classify(self._load_soa(landmarks)) & ARMS_CROSSED)
         except Exception as e:
             self.logger.error(f"Error detecting arms crossed: {e}")
             return False
@@ -152,17 +460,13 @@ class BodyLanguageAnalysis:
         Determine if shoulders are tilted based on pose landmarks.
         
         Parameters:
-        - landmarks: Pose landmarks detected by MediaPipe.
+        - landmarks: (num_landmarks, 5) landmark array returned by the pose backend.
         
         Returns:
         - bool: True if shoulders are tilted, False otherwise.
         """
         try:
-            left_shoulder = landmarks.landmark[self.mp_pose.PoseLandmark.LEFT_SHOULDER]
-            right_shoulder = landmarks.landmark[self.mp_pose.PoseLandmark.RIGHT_SHOULDER]
-
-            # Check if the difference between shoulders' y-coordinates is significant
-            return abs(left_shoulder.y - right_shoulder.y) > 0.1
+            return bool(self._classify(self._load_soa(landmarks)) & SHOULDERS_TILTED)
         except Exception as e:
             self.logger.error(f"Error detecting shoulders tilted: {e}")
             return False
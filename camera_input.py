@@ -1,63 +1,237 @@
 # sensors/eyes/camera_input.py
 import os
+import queue
+import threading
 
 import cv2
+import numpy as np
 
 from utils.logger import Logger
 
 logger = Logger()
 
+FACE_DETECTOR_PATH = os.path.join(os.path.dirname(__file__), "face_detection_yunet_2023mar_int8.onnx")
+EYE_CASCADE_PATH = os.path.join(os.path.dirname(__file__), "haarcascade_eye.xml")
+
+# Vision models are loaded once per process and shared by every module that needs them
+_face_detector = None
+_eye_cascade = None
+_models_lock = threading.Lock()
+_face_detector_lock = threading.Lock()  # FaceDetectorYN keeps per-call input size state
+
+
+class FrameLogThrottle:
+    def __init__(self, every=30):
+        """
+        Rate limiter for per-frame log messages.
+        :param every: Let one message through every this many calls (about once a second at 30 FPS).
+        """
+        self.every = every
+        self._count = 0
+
+    def __call__(self):
+        """
+        Count a call and report whether this one should be logged.
+        :return: True once every `every` calls.
+        """
+        self._count += 1
+        return self._count % self.every == 0
+
+
+def create_face_detector(input_size, score_threshold=0.6):
+    """
+    Create an INT8 YuNet face detector.
+    :param input_size: (width, height) of the frames that will be passed to the detector.
+    :param score_threshold: Minimum confidence for a detection to be kept.
+    :return: cv2.FaceDetectorYN instance.
+    """
+    return cv2.FaceDetectorYN.create(FACE_DETECTOR_PATH, "", input_size, score_threshold=score_threshold)
+
+
+def get_face_detector():
+    """
+    Return the shared YuNet face detector, loading it on first use.
+    :return: cv2.FaceDetectorYN instance.
+    """
+    global _face_detector
+    with _models_lock:
+        if _face_detector is None:
+            _face_detector = create_face_detector((320, 320))
+        return _face_detector
+
+
+def get_eye_cascade():
+    """
+    Return the shared Haar eye cascade, loading it on first use.
+    :return: cv2.CascadeClassifier instance.
+    """
+    global _eye_cascade
+    with _models_lock:
+        if _eye_cascade is None:
+            _eye_cascade = cv2.CascadeClassifier(EYE_CASCADE_PATH)
+        return _eye_cascade
+
+
+def detect_faces(detector, frame):
+    """
+    Run a YuNet detector on a BGR frame.
+    :param detector: cv2.FaceDetectorYN instance.
+    :param frame: The BGR frame in which to detect faces.
+    :return: (N, 4) int array of (x, y, w, h) face rectangles clipped to the frame; empty boxes are dropped.
+    """
+    height, width = frame.shape[:2]
+    with _face_detector_lock:
+        if tuple(detector.getInputSize()) != (width, height):
+            detector.setInputSize((width, height))
+        _, faces = detector.detect(frame)
+    if faces is None:
+        return np.empty((0, 4), dtype=np.int32)
+
+    boxes = faces[:, :4].astype(np.int32)
+    x0 = np.clip(boxes[:, 0], 0, width)
+    y0 = np.clip(boxes[:, 1], 0, height)
+    x1 = np.clip(boxes[:, 0] + boxes[:, 2], 0, width)
+    y1 = np.clip(boxes[:, 1] + boxes[:, 3], 0, height)
+    boxes = np.stack([x0, y0, x1 - x0, y1 - y0], axis=1)
+    return boxes[(boxes[:, 2] > 0) & (boxes[:, 3] > 0)]
+
+
+def scale_boxes(boxes, scale):
+    """
+    Map (x, y, w, h) boxes from inference-frame coordinates back to full-resolution coordinates.
+    :param boxes: Boxes detected on a downscaled frame.
+    :param scale: Scale factor returned by CameraInput.downscale_for_inference.
+    :return: (N, 4) int array of scaled boxes.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    return (boxes * scale).astype(np.int32)
+
+
 class CameraInput:
-    def __init__(self, camera_index=0):
+    def __init__(self, camera_index=0, jpeg_quality=85, inference_width=640):
         """
         Initialize the CameraInput class.
         :param camera_index: Index of the camera to use.
+        :param jpeg_quality: JPEG quality used when saving pictures.
+        :param inference_width: Width frames are downscaled to before running detectors.
         """
+        # Let OpenCV use every core and the OpenCL T-API where a device is available
+        cv2.setNumThreads(os.cpu_count())
+        cv2.ocl.setUseOpenCL(True)
+
         self.camera_index = camera_index
+        self.inference_width = inference_width
         self.cap = cv2.VideoCapture(self.camera_index)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Keep only the newest frame in the driver queue
         self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         
-        # Load pre-trained face and eye detection models
-        haarcascade_path = os.path.join(os.path.dirname(__file__), "haarcascade_frontalface_default.xml")
-        eye_cascade_path = os.path.join(os.path.dirname(__file__), "haarcascade_eye.xml")
+        # Load pre-trained face (YuNet INT8) and eye detection models
+        if not os.path.exists(FACE_DETECTOR_PATH) or not os.path.exists(EYE_CASCADE_PATH):
+            logger.error("Luna's vision resources (face detector or haarcascades) are missing.")
+            raise FileNotFoundError("Luna is Temporarily Blind - Face detection models are missing.")
         
-        if not os.path.exists(haarcascade_path) or not os.path.exists(eye_cascade_path):
-            logger.error("Luna's vision resources (haarcascades) are missing.")
-            raise FileNotFoundError("Luna is Temporarily Blind - Haarcascade files are missing.")
-        
-        self.face_cascade = cv2.CascadeClassifier(haarcascade_path)
-        self.eye_cascade = cv2.CascadeClassifier(eye_cascade_path)
+        self.face_detector = get_face_detector()
+        self.eye_cascade = get_eye_cascade()
 
         if not self.cap.isOpened():
             logger.error(f"Luna Unable to access the camera at index {self.camera_index}.")
             raise RuntimeError("Luna is Temporarily Blind - Camera not accessible.")
+
+        # Pictures are encoded and written to disk by a background writer thread
+        self.jpeg_quality = jpeg_quality
+        self._write_q = queue.Queue(maxsize=4)
+        self._writer_thread = threading.Thread(target=self._write_pictures, daemon=True)
+        self._writer_thread.start()
+
+        # A single reader thread owns cap.read() and publishes into the latest-frame slot
+        self.latest_frame = LatestFrame()
+        self._seen = threading.local()  # Last generation handed to each consumer thread
+        self._reading = threading.Event()
+        self._reading.set()
+        self._reader_thread = threading.Thread(target=self._read_frames, daemon=True)
+        self._reader_thread.start()
+        self._log_throttle = FrameLogThrottle()
+        self._display_slot = LatestFrame()  # Frames shown by display_frame
+        self._display_closed = None  # Closed event of the 'Luna Seeing' window once registered
         logger.info(f"Luna's visual system initialized using camera index {self.camera_index}.")
 
-    def capture_frame(self):
+    def _read_frames(self):
+        """
+        Reader thread: continuously read frames from the camera into the latest-frame slot.
+        Published frames are marked read-only because every consumer shares them.
+        Read failures are logged once when they start and again when capture recovers.
         """
-        Capture a single frame from the camera.
+        failing = False
+        while self._reading.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                if not failing:
+                    logger.error("Luna Unable to capture frames right now.")
+                    failing = True
+                self._reading.wait(0.01)
+                continue
+            if failing:
+                logger.info("Luna is capturing frames again.")
+                failing = False
+            frame.flags.writeable = False
+            self.latest_frame.set(frame)
+
+    def capture_frame(self, timeout=1.0):
+        """
+        Get the newest camera frame, waiting until one arrives that this thread has not seen yet.
+        The frame is shared and read-only; copy it before drawing on it.
+        :param timeout: Maximum time in seconds to wait for a new frame.
         :return: Captured frame or None if unsuccessful.
         """
-        ret, frame = self.cap.read()
-        if not ret:
+        last_generation = getattr(self._seen, "generation", 0)
+        frame, generation = self.latest_frame.wait(last_generation, timeout)
+        if generation == last_generation:
             logger.error("Luna Unable to capture frames right now.")
             return None
+        self._seen.generation = generation
         return frame
 
+    def downscale_for_inference(self, frame):
+        """
+        Shrink a frame to the inference resolution, preserving its aspect ratio.
+        Frames that are already small enough are returned unchanged.
+        :param frame: Full-resolution frame.
+        :return: Tuple of (inference_frame, scale); full-resolution coordinates = inference coordinates * scale.
+        """
+        height, width = frame.shape[:2]
+        if width <= self.inference_width:
+            return frame, 1.0
+        scale = width / self.inference_width
+        size = (self.inference_width, int(round(height / scale)))
+        return cv2.resize(frame, size, interpolation=cv2.INTER_AREA), scale
+
+    def capture_frame_for_inference(self, timeout=1.0):
+        """
+        Get the newest camera frame together with a downscaled copy for the detectors.
+        :param timeout: Maximum time in seconds to wait for a new frame.
+        :return: Tuple of (frame, inference_frame, scale), or (None, None, 1.0) if unsuccessful.
+        """
+        frame = self.capture_frame(timeout)
+        if frame is None:
+            return None, None, 1.0
+        inference_frame, scale = self.downscale_for_inference(frame)
+        return frame, inference_frame, scale
+
     def display_frame(self, frame):
         """
-        Display the captured frame in a window.
+        Display the captured frame in a window, drawn by the shared display thread.
         :param frame: The frame to display.
         """
         if frame is None:
             logger.error("Luna is unable to display an empty frame.")
             return
         
-        cv2.imshow('Luna Seeing', frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            logger.info("Luna is quitting the vision window.")
-            self.release_camera()
+        if self._display_closed is None:
+            self._display_closed = get_frame_display().register('Luna Seeing', self._display_slot)
+        elif self._display_closed.is_set():
+            return  # 'q' closed the window; the shared camera keeps running for the other modules
+        self._display_slot.set(frame)
 
     def find_faces(self, frame):
         """
@@ -69,13 +243,14 @@ class CameraInput:
             logger.error("Luna cannot detect faces in an empty frame.")
             return []
         
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+        inference_frame, scale = self.downscale_for_inference(frame)
+        faces = scale_boxes(detect_faces(self.face_detector, inference_frame), scale)
         
-        if not faces.any():
-            logger.info("No faces detected in the current frame.")
-        else:
-            logger.info(f"Detected {len(faces)} face(s) in the current frame.")
+        if self._log_throttle():
+            if len(faces) == 0:
+                logger.debug("No faces detected in the current frame.")
+            else:
+                logger.debug(f"Detected {len(faces)} face(s) in the current frame.")
         return faces
 
     def detect_facial_features(self, frame, faces):
@@ -83,47 +258,230 @@ class CameraInput:
         Detect facial features (like eyes) in the detected faces.
         :param frame: The frame containing the faces.
         :param faces: List of face bounding boxes.
-        :return: Frame with facial features highlighted.
+        :return: Copy of the frame with facial features highlighted (camera frames are read-only).
         """
         if frame is None or len(faces) == 0:
             logger.error("Luna cannot detect facial features without faces.")
             return frame
         
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        # Run the eye cascade on the downscaled gray frame and map the eyes back up for drawing
+        inference_frame, scale = self.downscale_for_inference(frame)
+        use_opencl = cv2.ocl.useOpenCL()
+        if use_opencl:
+            # Convert on the device and keep the gray frame there across the eye cascade calls
+            gray = cv2.cvtColor(cv2.UMat(inference_frame), cv2.COLOR_BGR2GRAY)
+        else:
+            gray = cv2.cvtColor(inference_frame, cv2.COLOR_BGR2GRAY)
+        min_eye_size = max(1, int(30 / scale))
+        frame = frame.copy()  # Draw on a private copy; the shared camera frame is read-only
         
         for (x, y, w, h) in faces:
             face_roi = frame[y:y+h, x:x+w]
-            eyes = self.eye_cascade.detectMultiScale(cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY), scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+            sx, sy, sw, sh = (int(v / scale) for v in (x, y, w, h))
+            gray_roi = cv2.UMat(gray, (sy, sy + sh), (sx, sx + sw)) if use_opencl else gray[sy:sy+sh, sx:sx+sw]
+            eyes = self.eye_cascade.detectMultiScale(gray_roi, scaleFactor=1.1, minNeighbors=5, minSize=(min_eye_size, min_eye_size))
             
-            for (ex, ey, ew, eh) in eyes:
+            for (ex, ey, ew, eh) in scale_boxes(eyes, scale).tolist():
                 cv2.rectangle(face_roi, (ex, ey), (ex + ew, ey + eh), (0, 255, 0), 2)
             
             cv2.rectangle(frame, (x, y), (x + w, y + h), (255, 0, 0), 2)
         
-        logger.info("Luna detected facial features in the frame.")
+        if self._log_throttle():
+            logger.debug("Luna detected facial features in the frame.")
         return frame
 
     def take_picture(self, frame, file_name="luna_image.jpg"):
         """
-        Save the captured frame as an image.
+        Queue the captured frame to be saved as an image; returns without waiting for the write.
         :param frame: Frame to save as an image.
         :param file_name: File name for the saved image.
-        :return: Path to the saved image.
+        :return: Path the image will be saved to, or None if it could not be queued.
         """
         if frame is None:
             logger.error("Luna cannot take a picture of an empty frame.")
             return None
         
-        cv2.imwrite(file_name, frame)
-        logger.info(f"Luna has saved a picture to {file_name}.")
+        try:
+            self._write_q.put_nowait((frame.copy(), file_name))
+        except queue.Full:
+            logger.warning(f"Luna is still saving earlier pictures; dropping {file_name}.")
+            return None
         return file_name
 
+    def _write_pictures(self):
+        """
+        Background writer: encode queued frames in memory, in the format named by the file extension
+        (JPEG when there is none), and write the bytes to disk.
+        """
+        while True:
+            frame, file_name = self._write_q.get()
+            try:
+                extension = os.path.splitext(file_name)[1].lower() or ".jpg"
+                params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality] if extension in (".jpg", ".jpeg") else []
+                ok, encoded = cv2.imencode(extension, frame, params)
+                if not ok:
+                    raise ValueError(f"{extension} encoding failed")
+                with open(file_name, "wb") as f:
+                    f.write(encoded.tobytes())
+                logger.info(f"Luna has saved a picture to {file_name}.")
+            except Exception as e:
+                logger.error(f"Luna could not save a picture to {file_name}: {e}")
+            finally:
+                self._write_q.task_done()
+
     def release_camera(self):
         """
-        Release the camera and destroy any OpenCV windows.
+        Release the camera and close its display window.
         """
+        self._reading.clear()
+        self._reader_thread.join(timeout=1.0)
+        self._write_q.join()  # Let pending pictures finish writing
+        with _camera_inputs_lock:
+            if _camera_inputs.get(self.camera_index) is self:
+                del _camera_inputs[self.camera_index]
         if self.cap.isOpened():
             self.cap.release()
             logger.info("Luna has released the camera resource.")
-        cv2.destroyAllWindows()
+        get_frame_display().unregister('Luna Seeing')
         logger.info("All vision-related windows have been closed.")
+
+
+_camera_inputs = {}
+_camera_inputs_lock = threading.Lock()
+
+
+def get_camera_input(camera_index=0):
+    """
+    Return the shared CameraInput for a camera, creating it on first use.
+    All vision modules read from the same instance so the device is only read once per frame.
+    :param camera_index: Index of the camera to use.
+    :return: The shared CameraInput instance.
+    """
+    with _camera_inputs_lock:
+        camera_input = _camera_inputs.get(camera_index)
+        if camera_input is None:
+            camera_input = CameraInput(camera_index)
+            _camera_inputs[camera_index] = camera_input
+        return camera_input
+
+
+class LatestFrame:
+    def __init__(self):
+        """
+        Single-slot frame buffer shared between a producer and its consumers.
+        The producer overwrites the slot; consumers only ever see the newest frame.
+        """
+        self._frame = None
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._new_frame = threading.Condition(self._lock)
+
+    def set(self, frame):
+        """
+        Publish a new frame, replacing whatever was there before, and wake any waiters.
+        :param frame: The frame to publish. It must not be modified afterwards.
+        """
+        with self._lock:
+            self._frame = frame
+            self._generation += 1
+            self._new_frame.notify_all()
+
+    def wait(self, after_generation, timeout=None):
+        """
+        Block until a frame newer than `after_generation` is published.
+        :param after_generation: Generation the caller has already seen.
+        :param timeout: Maximum time in seconds to wait.
+        :return: Tuple of (frame, generation); generation is unchanged on timeout.
+        """
+        with self._lock:
+            self._new_frame.wait_for(lambda: self._generation > after_generation, timeout)
+            return self._frame, self._generation
+
+    def peek(self):
+        """
+        Read the newest frame without consuming it.
+        :return: Tuple of (frame, generation); generation increases on every set.
+        """
+        with self._lock:
+            return self._frame, self._generation
+
+
+class FrameDisplay(threading.Thread):
+    def __init__(self):
+        """
+        Daemon thread that owns every OpenCV GUI call in the process (HighGUI is not thread-safe).
+        Modules register a window name with the LatestFrame it should show; use get_frame_display().
+        """
+        super().__init__(daemon=True)
+        self._windows = {}  # window name -> [LatestFrame, closed event, last shown generation]
+        self._closing = []  # Window names to destroy on the display thread
+        self._lock = threading.Lock()
+        self._changed = threading.Event()  # Wakes the idle thread when a window is registered
+
+    def register(self, window_name, latest_frame):
+        """
+        Start showing a LatestFrame slot in its own window.
+        :param window_name: Title of the OpenCV window.
+        :param latest_frame: The LatestFrame to display.
+        :return: threading.Event set once the window is closed ('q' pressed or unregister called).
+        """
+        closed = threading.Event()
+        with self._lock:
+            self._windows[window_name] = [latest_frame, closed, 0]
+        self._changed.set()
+        return closed
+
+    def unregister(self, window_name):
+        """
+        Stop showing a window; it is destroyed on the display thread.
+        :param window_name: Title passed to register.
+        """
+        with self._lock:
+            window = self._windows.pop(window_name, None)
+            if window is not None:
+                window[1].set()
+                self._closing.append(window_name)
+        self._changed.set()
+
+    def run(self):
+        """
+        Show each new frame of every registered window once; 'q' closes all of them.
+        """
+        while True:
+            with self._lock:
+                windows = list(self._windows.items())
+                closing, self._closing = self._closing, []
+            for window_name in closing:
+                cv2.destroyWindow(window_name)
+            if not windows:
+                self._changed.wait()
+                self._changed.clear()
+                continue
+
+            for window_name, window in windows:
+                latest_frame, _, last_generation = window
+                frame, generation = latest_frame.peek()
+                if generation != last_generation:
+                    cv2.imshow(window_name, frame)
+                    window[2] = generation
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                logger.info("Luna is quitting the vision windows.")
+                for window_name, _ in windows:
+                    self.unregister(window_name)
+
+
+_frame_display = None
+_frame_display_lock = threading.Lock()
+
+
+def get_frame_display():
+    """
+    Return the process-wide FrameDisplay, starting its thread on first use.
+    :return: The shared FrameDisplay instance.
+    """
+    global _frame_display
+    with _frame_display_lock:
+        if _frame_display is None:
+            _frame_display = FrameDisplay()
+            _frame_display.start()
+        return _frame_display
@@ -1,26 +1,48 @@
+import os
+
 import numpy as np
 import cv2
-from sensors.eyes.camera_input import CameraInput
+import onnxruntime as ort
+from sensors.eyes.camera_input import (FrameLogThrottle, LatestFrame, detect_faces, get_camera_input,
+                                       get_frame_display, scale_boxes)
 from brain.sensory_inputs.visual.facial_recognition import FaceRecognition
 from utils.logger import Logger
 from utils.async_task_manager import AsyncTaskManager
 
 logger = Logger()
 
+MAX_FACES = 16  # Faces per batched forward pass
+
+# Execution providers in order of preference; only those available in the installed build are used
+PREFERRED_PROVIDERS = [
+    ('CUDAExecutionProvider', {'device_id': 0}),
+    'CoreMLExecutionProvider',
+    'NnapiExecutionProvider',
+    'CPUExecutionProvider',
+]
+
 class EmotionDetection:
-    def __init__(self, model_path):
+    def __init__(self, model_path, detect_every=5, face_margin=0.1):
         """
         Initialize the EmotionDetection system, load the emotion detection model, and set up camera input.
         Args:
             model_path (str): Path to the trained emotion detection model.
+            detect_every (int): Run face detection once every this many frames and reuse the boxes in between.
+            face_margin (float): Fraction by which reused face boxes are grown on each side.
         """
-        self.camera_input = CameraInput()
+        self.camera_input = get_camera_input()
         self.face_recognition = FaceRecognition()  # Reusing face recognition module to detect faces
         self.logger = Logger(name="EmotionDetection")
         self.model = self.load_model(model_path)
         self.task_manager = AsyncTaskManager(max_workers=2)
         self.task_manager.start()
 
+        # Skip-frame face detection state
+        self._detect_every = detect_every
+        self._face_margin = face_margin
+        self._frame_idx = 0
+        self._last_faces = []
+
         # Emotion map corresponding to model predictions
         self.emotion_map = {
             0: "Angry",
@@ -31,6 +53,18 @@ class EmotionDetection:
             5: "Surprise",
             6: "Neutral"
         }
+        self._emotion_labels = np.array([self.emotion_map[i] for i in range(len(self.emotion_map))])
+
+        # Reusable batch buffers (N, 48, 48, 1) for a single forward over all faces
+        self._face_batch = np.empty((MAX_FACES, 48, 48, 1), dtype=np.float32)
+        self._gray_batch = np.empty((MAX_FACES, 48, 48), dtype=np.uint8)
+        self._batch_resized = np.empty((48, 48, 3), dtype=np.uint8)
+
+        # Reusable single-face preprocessing buffers for process_face_for_emotion
+        self._resized = np.empty((48, 48, 3), dtype=np.uint8)
+        self._gray48 = np.empty((48, 48), dtype=np.uint8)
+        self._face48 = np.empty((48, 48), dtype=np.float32)
+        self._log_throttle = FrameLogThrottle()
         self.logger.info("EmotionDetection initialized.")
 
     def load_model(self, model_path):
@@ -43,14 +77,48 @@ class EmotionDetection:
             model: Loaded deep learning model.
         """
         try:
-            # Assuming the model is a deep learning model (e.g., Keras, PyTorch, TensorFlow)
-            model = cv2.dnn.readNetFromONNX(model_path)  # Example with ONNX model loading
-            self.logger.info("Emotion detection model loaded successfully.")
+            # Enable all graph fusions, run CPU kernels across every core and prefer an accelerator
+            session_options = ort.SessionOptions()
+            session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session_options.intra_op_num_threads = os.cpu_count()
+
+            available = ort.get_available_providers()
+            providers = [p for p in PREFERRED_PROVIDERS if (p[0] if isinstance(p, tuple) else p) in available]
+
+            model = ort.InferenceSession(model_path, session_options, providers=providers)
+            self._input_name = model.get_inputs()[0].name
+            self._output_name = model.get_outputs()[0].name
+
+            # On CUDA, bind the output to device memory and only copy the scores back
+            self._io_binding = None
+            if model.get_providers()[0] == 'CUDAExecutionProvider':
+                self._io_binding = model.io_binding()
+                self._io_binding.bind_output(self._output_name, 'cuda')
+
+            self.model = model
+            self._run_model(np.zeros((1, 48, 48, 1), dtype=np.float32))  # Warm up kernels and allocations
+            self.logger.info(f"Emotion detection model loaded successfully on {model.get_providers()[0]}.")
             return model
         except Exception as e:
             self.logger.error(f"Error loading model from {model_path}: {e}")
             return None
 
+    def _run_model(self, face_input):
+        """
+        Run the emotion model on a preprocessed (N, 48, 48, 1) batch.
+        Args:
+            face_input (numpy.ndarray): Normalized float32 face batch.
+
+        Returns:
+            numpy.ndarray: Emotion scores, one row per face.
+        """
+        if self._io_binding is None:
+            return self.model.run([self._output_name], {self._input_name: face_input})[0]
+
+        self._io_binding.bind_cpu_input(self._input_name, face_input)
+        self.model.run_with_iobinding(self._io_binding)
+        return self._io_binding.copy_outputs_to_cpu()[0]
+
     def detect_emotions_async(self):
         """
         Start asynchronous emotion detection using the AsyncTaskManager.
@@ -63,40 +131,103 @@ class EmotionDetection:
         Detect emotions in real-time using the camera feed.
         Captures the frame, detects faces, and applies the emotion detection model.
         """
+        latest_frame = LatestFrame()
+        window_closed = get_frame_display().register("Emotion Detection", latest_frame)
+
         try:
-            while True:
-                # Capture frame from camera
-                frame = self.camera_input.capture_frame()
+            while not window_closed.is_set():
+                # Capture frame from camera along with its downscaled inference copy
+                frame, inference_frame, scale = self.camera_input.capture_frame_for_inference()
                 if frame is None:
                     self.logger.error("Failed to capture frame from camera.")
                     continue
 
-                # Detect faces in the frame using face recognition
-                faces = self.face_recognition.detect_face(frame)
+                # Detect faces every few frames, reusing the last boxes in between
+                faces = self.track_faces(inference_frame)
 
-                # Process each detected face for emotion recognition
-                for (x, y, w, h) in faces:
-                    face_roi = frame[y:y+h, x:x+w]
-                    emotion = self.process_face_for_emotion(face_roi)
+                # Classify all detected faces in batched forward passes
+                emotions = self.predict_emotions(inference_frame, faces)
 
-                    if emotion:
-                        # Draw bounding box and emotion label on the frame
-                        cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
-                        cv2.putText(frame, emotion, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+                # Draw bounding boxes and emotion labels on a copy of the shared frame
+                if len(faces) > 0:
+                    frame = frame.copy()
+                for (x, y, w, h), emotion in zip(scale_boxes(faces, scale).tolist(), emotions):
+                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+                    cv2.putText(frame, emotion, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
 
-                # Display the frame with emotion annotations
-                cv2.imshow("Emotion Detection", frame)
-
-                # Break the loop if 'q' key is pressed
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+                # Hand the annotated frame to the display thread
+                latest_frame.set(frame)
 
         except Exception as e:
             self.logger.error(f"Error during emotion detection: {e}")
         finally:
             # Release resources
-            self.camera_input.release()
-            cv2.destroyAllWindows()
+            get_frame_display().unregister("Emotion Detection")
+
+    def track_faces(self, frame):
+        """
+        Run face detection every `detect_every` frames; on intermediate frames reuse the
+        previous bounding boxes grown by `face_margin` and clipped to the frame.
+
+        Args:
+            frame (numpy.ndarray): The current camera frame.
+
+        Returns:
+            list: Face bounding boxes as (x, y, w, h) tuples.
+        """
+        run_detector = self._frame_idx % self._detect_every == 0
+        self._frame_idx += 1
+
+        if run_detector:
+            self._last_faces = detect_faces(self.face_recognition.face_detector, frame)
+            return self._last_faces
+
+        if len(self._last_faces) == 0:
+            return []
+
+        boxes = np.asarray(self._last_faces, dtype=np.int32).reshape(-1, 4)
+        frame_height, frame_width = frame.shape[:2]
+        pad_x = (boxes[:, 2] * self._face_margin).astype(np.int32)
+        pad_y = (boxes[:, 3] * self._face_margin).astype(np.int32)
+        x0 = np.clip(boxes[:, 0] - pad_x, 0, frame_width)
+        y0 = np.clip(boxes[:, 1] - pad_y, 0, frame_height)
+        x1 = np.clip(boxes[:, 0] + boxes[:, 2] + pad_x, 0, frame_width)
+        y1 = np.clip(boxes[:, 1] + boxes[:, 3] + pad_y, 0, frame_height)
+        return list(zip(x0.tolist(), y0.tolist(), (x1 - x0).tolist(), (y1 - y0).tolist()))
+
+    def predict_emotions(self, frame, faces):
+        """
+        Predict the emotion of every face in the frame, stacking up to MAX_FACES crops
+        into one input tensor per forward pass.
+
+        Args:
+            frame (numpy.ndarray): The current camera frame.
+            faces (list): Face bounding boxes as (x, y, w, h) tuples.
+
+        Returns:
+            list: The predicted emotion for each face, or an empty list on failure.
+        """
+        emotions = []
+        try:
+            for start in range(0, len(faces), MAX_FACES):
+                chunk = faces[start:start + MAX_FACES]
+                n = len(chunk)
+
+                # Preprocess each face ROI (resize, grayscale) into its batch slot
+                for i, (x, y, w, h) in enumerate(chunk):
+                    cv2.resize(frame[y:y+h, x:x+w], (48, 48), dst=self._batch_resized)
+                    cv2.cvtColor(self._batch_resized, cv2.COLOR_BGR2GRAY, dst=self._gray_batch[i])
+                np.multiply(self._gray_batch[:n], 1.0 / 255.0, out=self._face_batch[:n, :, :, 0])
+
+                # Perform emotion prediction for the whole chunk at once
+                predictions = self._run_model(self._face_batch[:n])
+
+                labels = predictions.reshape(n, -1).argmax(axis=1)
+                emotions.extend(np.take(self._emotion_labels, labels).tolist())
+        except Exception as e:
+            self.logger.error(f"Error predicting emotions for faces: {e}")
+            return []
+        return emotions
 
     def process_face_for_emotion(self, face_roi):
         """
@@ -109,30 +240,46 @@ class EmotionDetection:
             str: The predicted emotion or None if no emotion is detected.
         """
         try:
-            # Preprocess the face ROI (resize, grayscale, normalize)
-            face_roi = cv2.resize(face_roi, (48, 48))
-            face_roi = cv2.cvtColor(face_roi, cv2.COLOR_BGR2GRAY)
-            face_roi = face_roi.astype("float32") / 255.0  # Normalize pixel values
+            # Preprocess the face ROI (resize, grayscale, normalize) into the preallocated buffers
+            cv2.resize(face_roi, (48, 48), dst=self._resized)
+            cv2.cvtColor(self._resized, cv2.COLOR_BGR2GRAY, dst=self._gray48)
+            face_roi = np.multiply(self._gray48, np.float32(1.0 / 255.0), out=self._face48)  # Normalize pixel values
 
-            # Reshape for model input
-            face_input = np.expand_dims(face_roi, axis=0)  # Add batch dimension
-            face_input = np.expand_dims(face_input, axis=-1)  # Add channel dimension
+            # Reshape for model input (zero-copy view adding batch and channel dimensions)
+            face_input = face_roi.reshape(1, 48, 48, 1)
 
             # Perform emotion prediction
-            self.model.setInput(face_input)
-            prediction = self.model.forward()
+            prediction = self._run_model(face_input)
 
             # Extract the emotion label with the highest confidence
             emotion_index = np.argmax(prediction)
             emotion = self.emotion_map[emotion_index]
 
-            self.logger.info(f"Detected emotion: {emotion}")
+            if self._log_throttle():
+                self.logger.debug(f"Detected emotion: {emotion}")
             return emotion
 
         except Exception as e:
             self.logger.error(f"Error processing face for emotion: {e}")
             return None
 
+    @staticmethod
+    def quantize_model(model_path, quantized_model_path):
+        """
+        Quantize an ONNX emotion model's weights to INT8 offline.
+        Args:
+            model_path (str): Path to the float32 ONNX model.
+            quantized_model_path (str): Where to write the INT8 model.
+
+        Returns:
+            str: Path to the quantized model.
+        """
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(model_path, quantized_model_path, weight_type=QuantType.QInt8)
+        logger.info(f"Quantized emotion model written to {quantized_model_path}.")
+        return quantized_model_path
+
     def stop_emotion_detection(self):
         """
         Stop any ongoing emotion detection tasks.
@@ -1,22 +1,34 @@
 import os
+import threading
 import cv2
 import numpy as np
-from sensors.eyes.camera_input import CameraInput
+from joblib import Parallel, delayed
+from sensors.eyes.camera_input import FrameLogThrottle, detect_faces, get_camera_input, get_face_detector
 from utils.logger import Logger
 from utils.async_task_manager import AsyncTaskManager
 
 logger = Logger()
 
+FACE_SIZE = (100, 100)  # Fixed gray face size used for LBPH training and prediction
+
 class FaceRecognition:
-    def __init__(self, known_faces_dir="brain/sensory_inputs/visual/known_faces"):
+    def __init__(self, known_faces_dir="brain/sensory_inputs/visual/known_faces", target_fps=10):
         """
-        Initialize the face recognition system, load the Haar Cascade for face detection,
+        Initialize the face recognition system, load the YuNet face detector,
         and load the known faces for recognition.
+
+        Parameters:
+        - known_faces_dir: Directory containing the known face images.
+        - target_fps: Maximum rate at which the background recognition task checks frames.
         """
-        self.camera_input = CameraInput()
-        self.face_cascade = cv2.CascadeClassifier(os.path.join(os.path.dirname(__file__), "haarcascade_frontalface_default.xml"))
+        self.camera_input = get_camera_input()
+        self.face_detector = get_face_detector()  # Shared with CameraInput
         self.recognizer = cv2.face.LBPHFaceRecognizer_create()
         self.logger = Logger(name="FaceRecognition")
+        self._log_throttle = FrameLogThrottle()
+        self.target_fps = target_fps
+        self._stop_event = threading.Event()  # Signals the background recognition task to exit
+        self._last_recognized = None  # Last identity reported by the recognition task, to log only changes
         self.task_manager = AsyncTaskManager(max_workers=3)
         self.task_manager.start()
 
@@ -31,18 +43,31 @@ class FaceRecognition:
         Load known faces and labels from the specified directory.
         Train the face recognizer model with the loaded faces.
         """
+        def read_face(filename):
+            image = cv2.imread(os.path.join(known_faces_dir, filename), cv2.IMREAD_GRAYSCALE)
+            if image is not None:
+                image = cv2.resize(image, FACE_SIZE)
+            return os.path.splitext(filename)[0], image
+
+        # Decode the images in parallel; cv2.imread releases the GIL so threads overlap I/O and decode
+        results = Parallel(n_jobs=-1, prefer="threads")(
+            delayed(read_face)(filename)
+            for filename in os.listdir(known_faces_dir)
+            if filename.endswith((".jpg", ".png"))
+        )
+
         faces = []
         labels = []
         self.known_face_names = []
 
-        for label, filename in enumerate(os.listdir(known_faces_dir)):
-            if filename.endswith(".jpg") or filename.endswith(".png"):
-                image_path = os.path.join(known_faces_dir, filename)
-                image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-                faces.append(image)
-                labels.append(label)
-                self.known_face_names.append(os.path.splitext(filename)[0])
-                self.logger.info(f"Loaded face data for {os.path.splitext(filename)[0]}")
+        for name, image in results:
+            if image is None:
+                self.logger.warning(f"Could not read face data for {name}, skipping.")
+                continue
+            labels.append(len(self.known_face_names))
+            faces.append(image)
+            self.known_face_names.append(name)
+        self.logger.info(f"Loaded face data for {len(self.known_face_names)} known face(s).")
 
         if faces and labels:
             self.recognizer.train(faces, np.array(labels))
@@ -50,30 +75,32 @@ class FaceRecognition:
         else:
             self.logger.warning("No known faces found, model not trained.")
 
-    def detect_face(self):
+    def detect_face(self, frame):
         """
-        Detect a face in the frame using the Haar Cascade face detector.
-        Returns the region of interest (ROI) of the detected face.
+        Detect a face in the given frame using the YuNet face detector.
+
+        Parameters:
+        - frame: The BGR frame to search.
+
+        Returns:
+        - numpy.ndarray: The grayscale region of interest (ROI) of the first detected face,
+          or None if no face is found.
         """
-        face_found = False
-        face_roi = None
+        if frame is None:
+            return None
 
         try:
-            while not face_found:
-                ret, frame = self.camera_input.get_frame()
-                gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                faces = self.face_cascade.detectMultiScale(gray_frame, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-
-                for (x, y, w, h) in faces:
-                    face_found = True
-                    face_roi = gray_frame[y:y+h, x:x+w]
-                    self.logger.info("Face detected.")
-                    break
+            faces = detect_faces(self.face_detector, frame)
+            if len(faces) == 0:
+                return None
 
+            x, y, w, h = faces[0]
+            if self._log_throttle():
+                self.logger.debug("Face detected.")
+            return cv2.cvtColor(frame[y:y+h, x:x+w], cv2.COLOR_BGR2GRAY)
         except Exception as e:
             self.logger.error(f"Error detecting face: {e}")
-
-        return face_roi
+            return None
 
     def collect_face_data(self, face_roi):
         """
@@ -83,11 +110,10 @@ class FaceRecognition:
         - face_roi: The region of interest of the detected face.
         
         Returns:
-        - numpy.ndarray: The processed face data suitable for recognition.
+        - numpy.ndarray: The 2-D uint8 gray face, resized to FACE_SIZE, as expected by LBPH.
         """
         try:
-            face_data = np.array(face_roi).reshape(-1, 1).astype(np.float32)
-            self.logger.info("Face data collected.")
+            face_data = cv2.resize(face_roi, FACE_SIZE)
             return face_data
         except Exception as e:
             self.logger.error(f"Error collecting face data: {e}")
@@ -129,10 +155,10 @@ class FaceRecognition:
             label, confidence = self.recognizer.predict(face_data)
             if confidence < 100:
                 name = self.known_face_names[label]
-                self.logger.info(f"Recognized face as {name} with confidence {confidence}.")
+                self.logger.debug(f"Recognized face as {name} with confidence {confidence}.")
                 return name
             else:
-                self.logger.info(f"Face not recognized with confidence {confidence}.")
+                self.logger.debug(f"Face not recognized with confidence {confidence}.")
                 return None
         except Exception as e:
             self.logger.error(f"Error recognizing face: {e}")
@@ -149,15 +175,23 @@ class FaceRecognition:
         """
         The internal task for asynchronously recognizing a face.
         """
+        self._stop_event.clear()
         try:
-            while True:
-                face_roi = self.detect_face()
+            while not self._stop_event.is_set():
+                frame = self.camera_input.capture_frame()
+                face_roi = self.detect_face(frame)
                 if face_roi is not None:
                     recognized_face = self.recognize_face(face_roi)
-                    if recognized_face:
-                        self.logger.info(f"Recognized face: {recognized_face}")
-                    else:
-                        self.logger.info("Face not recognized.")
+                    if recognized_face != self._last_recognized:
+                        # Report only when the identity changes, not on every checked frame
+                        if recognized_face:
+                            self.logger.info(f"Recognized face: {recognized_face}")
+                        else:
+                            self.logger.info("Face not recognized.")
+                        self._last_recognized = recognized_face
+
+                # Pace the task so it does not occupy a worker at the full camera rate
+                self._stop_event.wait(1.0 / self.target_fps)
         except Exception as e:
             self.logger.error(f"Error in asynchronous face recognition task: {e}")
 
@@ -167,6 +201,7 @@ class FaceRecognition:
         """
         try:
             self.logger.info("Stopping face recognition tasks...")
+            self._stop_event.set()
             self.task_manager.stop()
         except Exception as e:
             self.logger.error(f"Error stopping face recognition tasks: {e}")
@@ -1,31 +1,153 @@
+import queue
+import threading
+
 import cv2
 import mediapipe as mp
 import numpy as np
-from sensors.eyes.camera_input import CameraInput
+from numba import njit
+from sensors.eyes.camera_input import LatestFrame, get_camera_input, get_frame_display
 from utils.logger import Logger
 from utils.async_task_manager import AsyncTaskManager
 
 # Initialize logger for gesture recognition
 logger = Logger(name="GestureRecognition")
 
+# MediaPipe hand landmark indices used by the gesture checks, resolved from the enum once at import
+_HL = mp.solutions.hands.HandLandmark
+NUM_HAND_LANDMARKS = len(_HL)
+WRIST = int(_HL.WRIST)
+THUMB_TIP = int(_HL.THUMB_TIP)
+INDEX_MCP, INDEX_PIP, INDEX_TIP = int(_HL.INDEX_FINGER_MCP), int(_HL.INDEX_FINGER_PIP), int(_HL.INDEX_FINGER_TIP)
+# Index, middle, ring and pinky finger tips and their PIP joints
+FINGER_TIPS = np.array([int(_HL.INDEX_FINGER_TIP), int(_HL.MIDDLE_FINGER_TIP),
+                        int(_HL.RING_FINGER_TIP), int(_HL.PINKY_TIP)])
+FINGER_PIPS = np.array([int(_HL.INDEX_FINGER_PIP), int(_HL.MIDDLE_FINGER_PIP),
+                        int(_HL.RING_FINGER_PIP), int(_HL.PINKY_PIP)])
+
+# Gesture codes returned by classify_hand
+HAND_NONE = 0
+HAND_THUMBS_UP = 1
+HAND_POINT_LEFT = 2
+HAND_POINT_RIGHT = 3
+
+HAND_GESTURES = {
+    HAND_THUMBS_UP: "thumbs_up",
+    HAND_POINT_LEFT: "point_left",
+    HAND_POINT_RIGHT: "point_right",
+}
+
+
+@njit(cache=True, fastmath=True)
+def classify_hand(hand):
+    """
+    Classify a (21, 3) float32 hand landmark array into one of the HAND_* gesture codes.
+    """
+    # Thumbs up: thumb tip above every other finger tip
+    thumb_y = hand[THUMB_TIP, 1]
+    thumbs_up = True
+    for k in range(4):
+        if thumb_y >= hand[FINGER_TIPS[k], 1]:
+            thumbs_up = False
+            break
+    if thumbs_up:
+        return HAND_THUMBS_UP
+
+    # Pointing: index finger extended, middle/ring/pinky curled (tip closer to the wrist than its PIP joint)
+    wx = hand[WRIST, 0]
+    wy = hand[WRIST, 1]
+    for k in range(4):
+        tip = FINGER_TIPS[k]
+        pip = FINGER_PIPS[k]
+        tip_d2 = (hand[tip, 0] - wx) ** 2 + (hand[tip, 1] - wy) ** 2
+        pip_d2 = (hand[pip, 0] - wx) ** 2 + (hand[pip, 1] - wy) ** 2
+        if (k == 0) != (tip_d2 > pip_d2):
+            return HAND_NONE
+
+    # Direction from the index knuckle to its tip, horizontal enough to count as pointing sideways
+    dx = hand[INDEX_TIP, 0] - hand[INDEX_MCP, 0]
+    dy = hand[INDEX_TIP, 1] - hand[INDEX_MCP, 1]
+    if abs(dx) <= abs(dy):
+        return HAND_NONE
+    return HAND_POINT_LEFT if dx < 0 else HAND_POINT_RIGHT
+
+
+def _landmarks_to_array(hand_landmarks):
+    """
+    Copy MediaPipe hand landmarks into a (21, 3) float32 array of normalized x, y, z.
+    """
+    return np.fromiter(
+        (c for lm in hand_landmarks.landmark for c in (lm.x, lm.y, lm.z)),
+        dtype=np.float32, count=NUM_HAND_LANDMARKS * 3,
+    ).reshape(NUM_HAND_LANDMARKS, 3)
+
+
+def put_latest(stage_queue, item):
+    """
+    Put an item on a bounded pipeline queue, dropping the oldest entry when it is full
+    so a slow stage never backs up the stages feeding it.
+    """
+    try:
+        stage_queue.put_nowait(item)
+    except queue.Full:
+        try:
+            stage_queue.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            stage_queue.put_nowait(item)
+        except queue.Full:
+            pass
+
+
 class GestureRecognition:
-    def __init__(self):
+    def __init__(self, inference_size=256, detect_every=3, show_preview=False, task_manager=None):
         """
-        Initialize MediaPipe Pose and Hand modules, task manager for asynchronous gesture recognition, 
-        and other configurations.
+        Initialize the MediaPipe Holistic module (pose and hands in one graph), task manager
+        for asynchronous gesture recognition, and other configurations.
+
+        Parameters:
+        - inference_size: Length of the long side frames are downscaled to before MediaPipe inference.
+        - detect_every: Run MediaPipe once every this many frames; frames in between reuse the last gesture.
+        - show_preview: Show the camera frames in a window (pressing 'q' stops detection).
+        - task_manager: Shared AsyncTaskManager to run the pipeline on (needs 3 free workers);
+          a private one is created when omitted.
         """
         self.mp_pose = mp.solutions.pose
-        self.mp_hands = mp.solutions.hands
-        self.pose = self.mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
-        self.hands = self.mp_hands.Hands(min_detection_confidence=0.5, min_tracking_confidence=0.5)
-        self.cap = CameraInput()  # Custom CameraInput class for video stream capture
+        # Holistic shares one person detector between the pose and hand models
+        self.holistic = mp.solutions.holistic.Holistic(
+            min_detection_confidence=0.5, min_tracking_confidence=0.5, model_complexity=0
+        )
+        self.cap = get_camera_input()  # Shared CameraInput for video stream capture
         self.logger = logger
 
-        # Initialize async task manager for non-blocking gesture detection
-        self.task_manager = AsyncTaskManager(max_workers=2)
-        self.task_manager.start()
+        # Downscale target for MediaPipe, recomputed only when the camera frame shape changes
+        self.inference_size = inference_size
+        self.show_preview = show_preview
+        self._frame_shape = None
+        self._inference_dims = None
+        self._resized = None  # Reused BGR resize target; only the capture stage touches it
+
+        # Skip-frame tracking state
+        self._detect_every = detect_every
+        self._frame_idx = 0
+        self._last_gesture = None
+
+        # Capture -> inference -> post-processing pipeline stages and their bounded queues
+        self._stop_event = threading.Event()
+        self._frame_queue = queue.Queue(maxsize=2)
+        self._result_queue = queue.Queue(maxsize=2)
+
+        # Async task manager for non-blocking gesture detection (one worker per stage)
+        self._owns_task_manager = task_manager is None
+        if self._owns_task_manager:
+            task_manager = AsyncTaskManager(max_workers=3)
+            task_manager.start()
+        self.task_manager = task_manager
 
         self.gesture_map = self.define_gestures()  # Map gestures to actions
+
+        # Compile the hand classifier now so the first detected hand isn't charged for it
+        classify_hand(np.zeros((NUM_HAND_LANDMARKS, 3), dtype=np.float32))
         self.logger.info("GestureRecognition initialized.")
 
     def define_gestures(self):
@@ -53,70 +175,148 @@ class GestureRecognition:
     def detect_gestures(self):
         """
         Detects gestures from the camera input.
-        Uses MediaPipe to extract pose and hand landmarks and determine specific gestures.
+        Runs capture and MediaPipe inference as pipeline tasks and handles post-processing
+        (gesture analysis, actions and display) on the calling thread until stopped.
+        """
+        self._stop_event.clear()
+        self.task_manager.add_task(self._capture_worker, priority=1)
+        self.task_manager.add_task(self._inference_worker, priority=1)
+        self._post_worker()
+
+    def _capture_worker(self):
+        """
+        Pipeline stage 1: capture frames and prepare the MediaPipe input image.
         """
         try:
-            while True:
+            while not self._stop_event.is_set():
                 # Capture frame from the camera
                 frame = self.cap.capture_frame()
                 if frame is None:
                     self.logger.error("No frame captured from the camera.")
                     continue
 
-                # Convert the image to RGB as required by MediaPipe
-                image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                # Only every `detect_every`-th frame is prepared for inference; the rest pass through for display
+                run_detector = self._frame_idx % self._detect_every == 0
+                self._frame_idx += 1
+                image_rgb = self.prepare_inference_image(frame) if run_detector else None
+                put_latest(self._frame_queue, (frame, image_rgb))
+        except Exception as e:
+            self.logger.error(f"An error occurred while capturing frames for gesture recognition: {e}")
+            self._stop_event.set()
+
+    def _inference_worker(self):
+        """
+        Pipeline stage 2: run MediaPipe Holistic on the prepared images.
+        """
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    frame, image_rgb = self._frame_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
 
-                # Process the image to detect pose and hand landmarks
-                pose_results = self.pose.process(image_rgb)
-                hand_results = self.hands.process(image_rgb)
+                # Process the image to detect pose and hand landmarks in a single pass
+                results = self.holistic.process(image_rgb) if image_rgb is not None else None
+                put_latest(self._result_queue, (frame, results))
+        except Exception as e:
+            self.logger.error(f"An error occurred during gesture inference: {e}")
+            self._stop_event.set()
+
+    def _post_worker(self):
+        """
+        Pipeline stage 3: analyze landmarks, perform actions and hand frames to the shared display thread.
+        """
+        if self.show_preview:
+            preview = LatestFrame()
+            preview_closed = get_frame_display().register('Gesture Recognition', preview)
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    frame, results = self._result_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue
 
-                # Analyze pose and hand landmarks for gestures
-                detected_gesture = self.analyze_landmarks(pose_results, hand_results)
-                
-                # Perform action based on detected gesture
-                if detected_gesture:
-                    self.logger.info(f"Detected gesture: {detected_gesture}")
-                    self.perform_action(detected_gesture)
+                # Skipped frames keep the last gesture and do not repeat its action
+                if results is not None:
+                    # Analyze pose and hand landmarks for gestures
+                    self._last_gesture = self.analyze_landmarks(
+                        results.pose_landmarks, results.left_hand_landmarks, results.right_hand_landmarks
+                    )
 
-                # Display the frame (can be omitted in a headless setup)
-                cv2.imshow('Gesture Recognition', frame)
+                    # Perform action based on detected gesture
+                    if self._last_gesture:
+                        self.logger.info(f"Detected gesture: {self._last_gesture}")
+                        self.perform_action(self._last_gesture)
 
-                # Break the loop if 'q' key is pressed
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+                # Display the frame only when a preview is requested; headless runs stop via the stop event
+                if self.show_preview:
+                    preview.set(frame)
+
+                    # Stop the pipeline once the preview window is closed ('q' pressed)
+                    if preview_closed.is_set():
+                        self._stop_event.set()
 
         except Exception as e:
             self.logger.error(f"An error occurred during gesture recognition: {e}")
         finally:
-            # Release resources
-            self.cap.release()
-            cv2.destroyAllWindows()
+            # Release resources (the shared camera stays open for other modules)
+            self._stop_event.set()
+            if self.show_preview:
+                get_frame_display().unregister('Gesture Recognition')
 
-    def analyze_landmarks(self, pose_results, hand_results):
+    def prepare_inference_image(self, frame):
+        """
+        Downscale a BGR frame to `inference_size` on its long side and convert it to RGB.
+        MediaPipe landmarks are normalized, so no coordinates need to be scaled back.
+        
+        Parameters:
+        - frame: BGR frame captured from the camera.
+        
+        Returns:
+        - numpy.ndarray: Read-only RGB image ready for MediaPipe.
+        """
+        if frame.shape[:2] != self._frame_shape:
+            height, width = frame.shape[:2]
+            scale = min(1.0, self.inference_size / max(height, width))
+            self._frame_shape = frame.shape[:2]
+            self._inference_dims = (int(width * scale), int(height * scale))
+            self._resized = np.empty((self._inference_dims[1], self._inference_dims[0], 3), dtype=np.uint8)
+
+        # Colour conversion runs on the downscaled image, so it is the only per-frame allocation
+        if self._inference_dims != (frame.shape[1], frame.shape[0]):
+            frame = cv2.resize(frame, self._inference_dims, dst=self._resized, interpolation=cv2.INTER_AREA)
+        image_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        image_rgb.flags.writeable = False  # Lets MediaPipe use the buffer without copying
+        return image_rgb
+
+    def analyze_landmarks(self, pose_landmarks, left_hand_landmarks, right_hand_landmarks):
         """
         Analyze pose and hand landmarks to detect specific gestures.
         
         Parameters:
-        - pose_results: Pose landmarks detected by MediaPipe.
-        - hand_results: Hand landmarks detected by MediaPipe.
+        - pose_landmarks: Pose landmarks detected by MediaPipe Holistic, or None.
+        - left_hand_landmarks: Left hand landmarks detected by MediaPipe Holistic, or None.
+        - right_hand_landmarks: Right hand landmarks detected by MediaPipe Holistic, or None.
         
         Returns:
         - str: Detected gesture name, or None if no gesture is detected.
         """
         try:
-            if hand_results.multi_hand_landmarks:
-                for hand_landmarks in hand_results.multi_hand_landmarks:
-                    # Example analysis for a "thumbs up" gesture
-                    if self.is_thumbs_up(hand_landmarks):
-                        return "thumbs_up"
-                    # Add more gesture recognition logic for hands here
+            for hand_landmarks in (left_hand_landmarks, right_hand_landmarks):
+                if hand_landmarks is None:
+                    continue
+                # Copy the landmarks once and run every hand check in the compiled kernel
+                gesture = HAND_GESTURES.get(classify_hand(_landmarks_to_array(hand_landmarks)))
+                if gesture:
+                    return gesture
+                # Add more gesture codes for hands to classify_hand
             
-            if pose_results.pose_landmarks:
-                if self.is_wave_gesture(pose_results.pose_landmarks):
+            if pose_landmarks:
+                if self.is_wave_gesture(pose_landmarks):
                     return "wave"
-                if self.is_pointing_left(pose_results.pose_landmarks):
+                if self.is_pointing_left(pose_landmarks):
                     return "point_left"
-                if self.is_pointing_right(pose_results.pose_landmarks):
+                if self.is_pointing_right(pose_landmarks):
                     return "point_right"
                 # Add more gesture recognition logic for poses here
 
@@ -125,30 +325,19 @@ class GestureRecognition:
             self.logger.error(f"Error analyzing landmarks: {e}")
             return None
 
-    def is_thumbs_up(self, hand_landmarks):
+    def is_thumbs_up(self, hand):
         """
         Determines if the hand gesture is a "thumbs up" based on landmarks.
         
         Parameters:
-        - hand_landmarks: Hand landmarks detected by MediaPipe.
+        - hand: (21, 3) array of hand landmarks from `_landmarks_to_array`.
         
         Returns:
         - bool: True if the gesture is a thumbs up, False otherwise.
         """
         try:
-            thumb_tip = hand_landmarks.landmark[self.mp_hands.HandLandmark.THUMB_TIP]
-            index_tip = hand_landmarks.landmark[self.mp_hands.HandLandmark.INDEX_FINGER_TIP]
-            middle_tip = hand_landmarks.landmark[self.mp_hands.HandLandmark.MIDDLE_FINGER_TIP]
-            ring_tip = hand_landmarks.landmark[self.mp_hands.HandLandmark.RING_FINGER_TIP]
-            pinky_tip = hand_landmarks.landmark[self.mp_hands.HandLandmark.PINKY_TIP]
-
-            # Check if thumb is extended upwards and other fingers are curled
-            if thumb_tip.y < index_tip.y and \
-               thumb_tip.y < middle_tip.y and \
-               thumb_tip.y < ring_tip.y and \
-               thumb_tip.y < pinky_tip.y:
-                return True
-            return False
+            # Check if thumb is extended upwards (above every other finger tip)
+            return classify_hand(hand) == HAND_THUMBS_UP
         except Exception as e:
             self.logger.error(f"Error detecting thumbs up gesture: {e}")
             return False
@@ -232,7 +421,9 @@ class GestureRecognition:
         """
         try:
             self.logger.info("Stopping gesture detection...")
-            self.task_manager.stop()
+            self._stop_event.set()
+            if self._owns_task_manager:
+                self.task_manager.stop()  # A shared pool is stopped by its owner
         except Exception as e:
             self.logger.error(f"Error stopping gesture detection: {e}")
 
@@ -1,14 +1,9 @@
 # gui.py
-import math
-import queue
-import random
 import sys
-import time
 from threading import Event, Thread
 
-import librosa
 import numpy as np
-from PyQt5.QtCore import QRectF, Qt, QTimer
+from PyQt5.QtCore import QLineF, QObject, QRectF, Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QBrush, QColor, QFont, QPainter, QPen, QRadialGradient
 from PyQt5.QtWidgets import QApplication, QLabel, QVBoxLayout, QWidget
 
@@ -17,67 +12,65 @@ from sensors.ears.microphone import \
 
 
 class NebulaParticle:
-    def __init__(self, canvas, x, y, vx, vy, size=5, color='lime'):
-        """Initialize particle with position, velocity, size, and color."""
+    def __init__(self, canvas, index):
+        """Thin view of one particle; its state lives in the canvas arrays."""
         self.canvas = canvas
-        self.x = x
-        self.y = y
-        self.vx = vx
-        self.vy = vy
-        self.size = size
-        self.color = color
-        self.is_active = False
-
-    def set_active(self, active):
-        """Activate or deactivate particle behavior based on state."""
-        self.is_active = active
-        self.color = 'yellow' if active else 'cyan'
-
-    def move(self, amplitude):
-        """Move particles based on amplitude from audio input."""
-        self.scale_size(amplitude)
-
-        if self.is_active:
-            self.vx += random.uniform(-0.3, 0.3)
-            self.vy += random.uniform(-0.3, 0.3)
-            self.x += self.vx
-            self.y += self.vy
-
-            # Boundary checks for the particle movement
-            if self.x < 0:
-                self.x = 0
-                self.vx *= -1
-            elif self.x > 800:
-                self.x = 800
-                self.vx *= -1
-
-            if self.y < 0:
-                self.y = 0
-                self.vy *= -1
-            elif self.y > 400:
-                self.y = 400
-                self.vy *= -1
-
-    def scale_size(self, amplitude):
-        """Scale particle size based on the audio amplitude."""
-        self.size = max(2, min(30, amplitude // 300))  # Adjusted size scaling for a glowing nebula effect
+        self.index = index
+
+    @property
+    def x(self):
+        return self.canvas.pos[self.index, 0]
+
+    @property
+    def y(self):
+        return self.canvas.pos[self.index, 1]
+
+    @property
+    def size(self):
+        return self.canvas.size[self.index]
+
+    @property
+    def is_active(self):
+        return self.canvas.active_all
+
+    @property
+    def color(self):
+        return NebulaNetwork.COLORS[self.canvas.color_idx]
 
 
 class NebulaNetwork(QWidget):
+    COLORS = ('cyan', 'magenta')  # Indexed by color_idx
+
     def __init__(self):
         """Initialize nebula particle network for visualization."""
         super().__init__()
-        self.particles = [
-            NebulaParticle(self, random.randint(0, 800), random.randint(0, 400),
-                           random.uniform(-2, 2), random.uniform(-2, 2))
-            for _ in range(70)  # Increased particle count for nebula effect
-        ]
+        num_particles = 70  # Increased particle count for nebula effect
+
+        # Particle state as arrays so movement and distances are computed for all particles at once
+        self._rng = np.random.default_rng()
+        self.bounds = np.array([800, 400], np.float32)
+        self.pos = self._rng.integers(0, self.bounds, (num_particles, 2), endpoint=True).astype(np.float32)
+        self.vel = self._rng.uniform(-2, 2, (num_particles, 2)).astype(np.float32)
+        self._jitter = np.empty_like(self.vel)
+        self.size = np.full(num_particles, 5, np.float32)
+        # Audio-driven behavior is the same for every particle, so it is kept as scalars
+        self.active_all = False
+        self.color_idx = 0
+
+        self.particles = [NebulaParticle(self, i) for i in range(num_particles)]
+
+        # One glow brush for every particle, in unit coordinates; paintEvent scales it to the particle size
+        gradient = QRadialGradient(0.5, 0.5, 1)
+        gradient.setColorAt(0, QColor(255, 255, 255, 150))  # Inner glow
+        gradient.setColorAt(1, QColor(0, 255, 255, 50))  # Outer cyan glow
+        self._particle_brush = QBrush(gradient)
+        self._line_pen = QPen(QColor('purple'), 0.8)
         self.amplitude = 0
-        self.lines = []
+        self.lines = np.empty((0, 4), np.float32)  # One (x1, y1, x2, y2) row per connecting line
 
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_particles)
-        self.timer.start(50)  # Update every 50ms for smooth particle animation
+        self.timer.start(33)  # Update every 33ms (~30 fps); the only source of animation ticks
 
     def paintEvent(self, event):
         """Handle painting of particles and lines to simulate a nebula."""
@@ -85,90 +78,151 @@ class NebulaNetwork(QWidget):
         painter.setRenderHint(QPainter.Antialiasing)
 
         # Draw particles with radial gradients to simulate glowing nebula particles
-        for particle in self.particles:
-            gradient = QRadialGradient(particle.x + particle.size / 2, particle.y + particle.size / 2, particle.size)
-            gradient.setColorAt(0, QColor(255, 255, 255, 150))  # Inner glow
-            gradient.setColorAt(1, QColor(0, 255, 255, 50))  # Outer cyan glow
-            brush = QBrush(gradient)
-            painter.setBrush(brush)
-            painter.setPen(Qt.NoPen)
-            painter.drawEllipse(QRectF(particle.x, particle.y, particle.size, particle.size))
+        painter.setBrush(self._particle_brush)
+        painter.setPen(Qt.NoPen)
+        unit_rect = QRectF(0, 0, 1, 1)
+        for (x, y), size in zip(self.pos.tolist(), self.size.tolist()):
+            painter.save()
+            painter.translate(x, y)
+            painter.scale(size, size)
+            painter.drawEllipse(unit_rect)
+            painter.restore()
 
         # Draw connecting lines between particles for the nebula's gaseous effect
-        for line in self.lines:
-            pen = QPen(QColor('purple'), 0.8)
-            painter.setPen(pen)
-            painter.drawLine(line[0], line[1])
+        painter.setPen(self._line_pen)
+        painter.drawLines([QLineF(*line) for line in self.lines.tolist()])
 
     def update_particles(self):
         """Update particle positions and redraw connections."""
-        for particle in self.particles:
-            particle.move(self.amplitude)
-
+        self.move_particles()
         self.update_lines()
         self.update()  # Trigger repaint to redraw particles
 
+    def move_particles(self):
+        """Move active particles based on amplitude from audio input."""
+        # Adjusted size scaling for a glowing nebula effect
+        self.size[:] = max(2, min(30, self.amplitude // 300))
+
+        if not self.active_all:
+            return
+
+        # One float32 draw into a preallocated buffer, mapped from [0, 1) to [-0.3, 0.3)
+        self._rng.random(dtype=np.float32, out=self._jitter)
+        self._jitter *= 0.6
+        self._jitter -= 0.3
+        self.vel += self._jitter
+        self.pos += self.vel
+
+        # Boundary checks: reflect the velocity of particles that left the canvas, then clamp them back
+        out = (self.pos < 0) | (self.pos > self.bounds)
+        self.vel[out] *= -1
+        np.clip(self.pos, 0, self.bounds, out=self.pos)
+
     def update_lines(self):
         """Draw lines between particles that are within a certain distance of each other."""
-        self.lines.clear()
+        diff = self.pos[:, None, :] - self.pos[None, :, :]
+        d2 = np.einsum('ijk,ijk->ij', diff, diff)
+        i, j = np.nonzero(np.triu(d2 < 150 * 150, k=1))  # Adjusted distance for more connections
 
-        for i, p1 in enumerate(self.particles):
-            for p2 in self.particles[i + 1:]:
-                distance = math.hypot(p1.x - p2.x, p1.y - p2.y)
-                if distance < 150:  # Adjusted distance for more connections
-                    self.lines.append(((p1.x + p1.size / 2, p1.y + p1.size / 2),
-                                       (p2.x + p2.size / 2, p2.y + p2.size / 2)))
+        # Lines join particle centres
+        centres = self.pos + self.size[:, None] / 2
+        self.lines = np.hstack((centres[i], centres[j]))
 
     def update_particle_behavior(self, mid_energy, treble_energy):
         """Update particle behavior based on audio energy levels."""
-        for particle in self.particles:
-            if mid_energy > 1000:  # Example threshold for mid frequencies
-                particle.set_active(True)
-            else:
-                particle.set_active(False)
-
-            if treble_energy > 500:  # Example threshold for treble frequencies
-                particle.color = 'magenta'
-            else:
-                particle.color = 'cyan'
-
-
-class AudioThread(Thread):
-    def __init__(self, microphone_input, nebula_network, stop_event):
-        """Initialize the thread to handle real-time audio input."""
-        super().__init__(daemon=True)
+        self.active_all = mid_energy > 1000  # Example threshold for mid frequencies
+        self.color_idx = 1 if treble_energy > 500 else 0  # Example threshold for treble frequencies
+
+
+class AudioThread:
+    def __init__(self, microphone_input, nebula_network, stop_event, n_fft=2048):
+        """Initialize the worker that handles real-time audio input."""
         self.microphone_input = microphone_input
         self.nebula_network = nebula_network
         self.stop_event = stop_event
+        self._finished = Event()
+
+        # Preallocated FFT window and frame buffer for the band analysis
+        self.n_fft = n_fft
+        # The ring holds int16-scale samples; folding 1/32768 into the window brings them back to [-1, 1)
+        # (the scale the energy thresholds were tuned for) without an extra pass over the frame
+        self._window = (np.hanning(n_fft) / 32768.0).astype(np.float32)
+        self._frame = np.zeros(n_fft, np.float32)
+        self._band_edges = np.array([0, 50, 200])  # Bass, mid and treble start bins
+
+    def start(self, task_manager=None):
+        """Run the audio loop on the shared task manager if given, otherwise on a daemon thread."""
+        if task_manager is not None:
+            task_manager.add_task(self.run, priority=1)
+        else:
+            Thread(target=self.run, daemon=True).start()
+
+    def join(self, timeout=None):
+        """Wait for the audio loop to exit after stop_event is set."""
+        self._finished.wait(timeout)
 
     def run(self):
         """Continuously capture audio and update particle animation based on frequency bands."""
+        try:
+            self._run()
+        finally:
+            self._finished.set()
+
+    def _run(self):
+        audio_ring = self.microphone_input.audio_ring
+        new_samples = audio_ring.subscribe()
         while not self.stop_event.is_set():
             try:
-                # Get the audio signal from the microphone input
-                audio_data = self.microphone_input.get_current_audio_data()
+                # Wait for the next hop of samples from the microphone callback
+                if not new_samples.wait(timeout=0.1):
+                    continue
+                new_samples.clear()
 
-                # Use librosa to analyze the audio signal
-                if len(audio_data) > 0:
-                    # Compute the short-time Fourier transform (STFT)
-                    stft = np.abs(librosa.stft(audio_data))
+                # Latest n_fft samples (zero-padded at the front if fewer have arrived)
+                if audio_ring.read_latest(self._frame) > 0:
+                    # Magnitude spectrum of the windowed, rescaled frame
+                    self._frame *= self._window
+                    spectrum = np.abs(np.fft.rfft(self._frame))
 
-                    # Summarize the amplitude of specific frequency bands (e.g., bass, mid, treble)
-                    bass_energy = np.sum(stft[:50])
-                    mid_energy = np.sum(stft[50:200])
-                    treble_energy = np.sum(stft[200:])
+                    # Summarize the amplitude of specific frequency bands (e.g., bass, mid, treble) in one pass
+                    bass_energy, mid_energy, treble_energy = np.add.reduceat(spectrum, self._band_edges)
 
                     # Use different energy levels to affect the animation
                     self.nebula_network.amplitude = bass_energy
                     self.nebula_network.update_particle_behavior(mid_energy, treble_energy)
-
-                time.sleep(0.05)
             except Exception as e:
                 print(f"Error in AudioThread: {e}")
 
 
+class LvsBridge(QObject):
+    updated = pyqtSignal(dict)
+
+    def __init__(self, lvs_queue):
+        """Forward messages from the voice system's queue to the GUI thread as Qt signals."""
+        super().__init__()
+        self.lvs_queue = lvs_queue
+        self.thread = Thread(target=self._forward, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        """Wake the forwarding thread with a sentinel and wait for it to exit."""
+        self.lvs_queue.put(None)
+        self.thread.join(timeout=1)
+
+    def _forward(self):
+        """Block on the queue and emit each message; the signal is delivered on the GUI thread."""
+        while True:
+            data = self.lvs_queue.get()
+            if data is None:
+                break
+            if isinstance(data, dict):
+                self.updated.emit(data)
+
+
 class MainWindow(QWidget):
-    def __init__(self, microphone_input, lvs_queue, root):
+    def __init__(self, microphone_input, lvs_queue, root, task_manager=None):
         """Initialize the main window for the GUI."""
         super().__init__()
 
@@ -207,33 +261,28 @@ class MainWindow(QWidget):
         self.microphone_input = microphone_input
         self.lvs_queue = lvs_queue
         self.stop_event = Event()
-        self.update_timer = QTimer(self)
-        self.update_timer.timeout.connect(self.update_animation)
-        self.update_timer.start(50)  # Update every 50ms
+
+        # Voice system updates arrive as signals instead of being polled from the queue
+        self.lvs_bridge = LvsBridge(self.lvs_queue)
+        self.lvs_bridge.updated.connect(self.on_lvs_message)
+        self.lvs_bridge.start()
+
         self.root = root
         self.audio_thread = AudioThread(self.microphone_input, self.nebula_network, self.stop_event)
-        self.audio_thread.start()
-        self.lvs_queue.put("start")
+        self.audio_thread.start(task_manager)
         self.show()
 
-    def update_animation(self):
-        """Update the nebula animation and GUI elements."""
+    def on_lvs_message(self, data):
+        """Update the status labels from a voice system message."""
         try:
-            if not self.lvs_queue.empty():
-                try:
-                    data = self.lvs_queue.get_nowait()
-                    if 'wake_word' in data:
-                        self.wake_word_label.setText(f"Wake Word: {data['wake_word']}")
-                        self.status_label.setText("Listening...")
-                except queue.Empty:
-                    pass
-            else:
+            if 'wake_word' in data:
+                self.wake_word_label.setText(f"Wake Word: {data['wake_word']}")
+                self.status_label.setText("Listening...")
+            elif data.get('type') == 'luna_asleep':
                 self.wake_word_label.setText("Wake Word: Not Detected")
                 self.status_label.setText("Listening...")
-
-            self.nebula_network.update()  # Update particle animation
         except Exception as e:
-            print(f"Error in update_animation: {e}")
+            print(f"Error in on_lvs_message: {e}")
 
     def keyPressEvent(self, event):
         """Handle key press event to stop the animation."""
@@ -244,6 +293,7 @@ class MainWindow(QWidget):
         """Handle closing the window and cleaning up resources."""
         self.stop_event.set()  # Stop the audio thread
         self.audio_thread.join()  # Ensure thread terminates
+        self.lvs_bridge.stop()  # Stop forwarding voice system messages
         self.microphone_input.close()  # Ensure the microphone stream is properly closed
         self.root.quit()  # Ensure the application quits
         event.accept()
@@ -1,10 +1,12 @@
 # luna.py
+import os
 import threading
 import time
-from queue import Queue
+from queue import SimpleQueue
 
 from sensors.ears.microphone import MicrophoneInput
 from sensors.lvs import LunaVoiceSystem
+from utils.async_task_manager import AsyncTaskManager
 from utils.logger import Logger
 
 logger = Logger()
@@ -21,11 +23,15 @@ class Luna:
         logger.info("Initializing Luna system...")
 
         try:
+            # One bounded worker pool shared by the GUI audio analysis and the vision modules
+            self.task_manager = AsyncTaskManager(max_workers=min(os.cpu_count() or 1, 4))
+            self.task_manager.start()
+
             # Initialize the microphone input
             self.microphone_input = MicrophoneInput()
 
             # Queue for inter-module communication (used to communicate with the GUI)
-            self.lvs_queue = Queue()
+            self.lvs_queue = SimpleQueue()
 
             # Initialize LunaVoiceSystem
             self.lvs = LunaVoiceSystem(lvs_queue=self.lvs_queue, microphone_input=self.microphone_input)
@@ -72,6 +78,9 @@ class Luna:
                 # Shut down the LunaVoiceSystem
                 self.lvs.shutdown()
 
+                # Stop the shared worker pool
+                self.task_manager.stop()
+
                 logger.info("Luna system stopped successfully.")
             except Exception as e:
                 logger.error(f"An error occurred while stopping Luna: {e}", exc_info=True)
@@ -90,7 +99,7 @@ class Luna:
             def run_gui():
                 # Set up the PyQt application and start the MainWindow
                 app = QApplication(sys.argv)
-                gui = MainWindow(self.microphone_input, self.lvs_queue, root=app)
+                gui = MainWindow(self.microphone_input, self.lvs_queue, root=app, task_manager=self.task_manager)
                 gui.show()
                 sys.exit(app.exec_())
 
@@ -1,9 +1,11 @@
 # sensors/lvs.py
+import functools
 import threading
-import time
-from queue import Empty, Full, Queue
+from collections import deque
+from queue import Full
 
 import spacy
+from spacy.matcher import PhraseMatcher
 
 from actions.execute import ActionExecutor
 from brain.respond.intro import Introduction
@@ -15,6 +17,32 @@ from utils.logger import Logger
 # Set up the logger
 logger = Logger()
 
+
+# Intent vocabulary: each intent label maps to the phrases that trigger it
+KNOWN_PHRASES = {
+    "GREETING": ("hello", "hi luna", "hey luna", "good morning", "good evening"),
+    "FAREWELL": ("goodbye", "bye", "good night", "see you later"),
+    "TIME": ("what time is it", "tell me the time", "current time"),
+    "DATE": ("what day is it", "what is the date", "today's date"),
+    "WEATHER": ("weather", "what's the weather", "is it going to rain"),
+    "STOP": ("stop", "cancel", "never mind", "be quiet"),
+    "SLEEP": ("go to sleep", "sleep", "that's all"),
+}
+
+
+@functools.lru_cache(maxsize=1)
+def _get_nlp():
+    """
+    Build the tokenizer-only spaCy pipeline and intent matcher on first use and share them process-wide.
+    Intent recognition is keyword matching, so no statistical model is loaded.
+    """
+    nlp = spacy.blank("en")
+    matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+    for intent, phrases in KNOWN_PHRASES.items():
+        matcher.add(intent, [nlp.make_doc(phrase) for phrase in phrases])
+    return nlp, matcher
+
+
 class LunaVoiceSystem:
     def __init__(self, lvs_queue=None, microphone_input=None):
         """
@@ -23,7 +51,6 @@ class LunaVoiceSystem:
         """
         try:
             self.lvs_queue = lvs_queue  # Queue for inter-module communication (to the GUI)
-            self.nlp = spacy.load("en_core_web_sm")
             self.microphone_input = microphone_input if microphone_input else MicrophoneInput()
 
             self.salutations = Salutations()
@@ -31,16 +58,42 @@ class LunaVoiceSystem:
             self.wake_word_detector = WakeWordDetector(self.microphone_input)
             self.action_executor = ActionExecutor()
             self.listening_for_commands = False
-            self.command_queue = Queue(maxsize=100)  # Command queue with a defined max size
+            self.command_queue = deque(maxlen=100)  # Pending commands; the oldest is dropped when full
+            self._command_ready = threading.Condition()  # Notified whenever a command or the stop sentinel is queued
             self.command_processor_thread = None
             self.lock = threading.Lock()  # Lock to manage concurrency and prevent race conditions
             self.user_interaction_thread = None  # Thread to handle post-wake interaction
+            self._activity_event = threading.Event()  # Set on user activity to restart the sleep countdown
 
             logger.info("Luna Voice System initialized successfully.")
         except Exception as e:
-            logger.error(f"Initialization error: {e}", exc_info=True)
+            logger.error("Initialization error: %s", e, exc_info=True)
             raise
     
+    @property
+    def nlp(self):
+        """
+        spaCy pipeline, built lazily the first time NLP features run.
+        """
+        return _get_nlp()[0]
+
+    def recognize_intent(self, text):
+        """
+        Match the transcribed text against the intent vocabulary.
+
+        Args:
+            text (str): The transcribed command.
+
+        Returns:
+            str: The label of the first matching intent, or None if nothing matched.
+        """
+        nlp, matcher = _get_nlp()
+        matches = matcher(nlp.make_doc(text))
+        if not matches:
+            return None
+        match_id, _, _ = min(matches, key=lambda match: match[1])
+        return nlp.vocab.strings[match_id]
+
     def process_luna(self):
         """
         Start the main loop of the Luna Voice System.
@@ -50,26 +103,29 @@ class LunaVoiceSystem:
 
         def wake_word_callback(detected_wake_word, confidence, matched_word):
             if detected_wake_word:
-                logger.info(f"Wake word '{matched_word}' detected with confidence {confidence}.")
+                logger.info("Wake word '%s' detected with confidence %s.", matched_word, confidence)
                 self.greet_user()  # Step 1: Greet user
                 self.introduce_user()  # Step 2: Introduction
 
-                # Step 3: Start a timer to return Luna to sleep after 15 seconds of inactivity
+                # Step 3: Return Luna to sleep after 15 seconds of inactivity, restarting a running countdown
                 if self.user_interaction_thread and self.user_interaction_thread.is_alive():
-                    self.user_interaction_thread.join()  # Ensure the previous timer thread ends
-                
-                self.user_interaction_thread = threading.Thread(target=self.return_to_sleep_after_timeout, daemon=True)
-                self.user_interaction_thread.start()
+                    self._activity_event.set()
+                else:
+                    self._activity_event.clear()
+                    self.user_interaction_thread = threading.Thread(target=self.return_to_sleep_after_timeout, daemon=True)
+                    self.user_interaction_thread.start()
 
         # Start the wake word detection
         self.wake_word_detector.listen_for_wake_word(wake_word_callback)
 
     def return_to_sleep_after_timeout(self):
         """
-        Return Luna to sleep after a 15-second timeout following user interaction.
+        Return Luna to sleep after 15 seconds without user interaction.
+        Any activity signalled through _activity_event restarts the countdown.
         """
         logger.info("Starting 15-second countdown to return to sleep...")
-        time.sleep(15)
+        while self._activity_event.wait(timeout=15):
+            self._activity_event.clear()  # User was active; start counting again
         self.stop_listening_for_commands()  # Stops any ongoing listening
         self.wake_word_detector.stop_listening()  # Restart wake word detection
         logger.info("Luna is going back to sleep.")
@@ -83,7 +139,7 @@ class LunaVoiceSystem:
             greeting = self.salutations.greetings()  # Get greeting from Salutations class
             self.update_gui_with_response(greeting)
         except Exception as e:
-            logger.error(f"Error during user greeting: {e}", exc_info=True)
+            logger.error("Error during user greeting: %s", e, exc_info=True)
 
     def introduce_user(self):
         """
@@ -93,7 +149,7 @@ class LunaVoiceSystem:
             introduction_message = self.introduction.introduce()  # Get introduction message
             self.update_gui_with_response(introduction_message)
         except Exception as e:
-            logger.error(f"Error during user introduction: {e}", exc_info=True)
+            logger.error("Error during user introduction: %s", e, exc_info=True)
 
     def listen_for_commands(self):
         """
@@ -109,11 +165,8 @@ class LunaVoiceSystem:
 
             def command_callback(transcribed_text):
                 if transcribed_text:
-                    try:
-                        self.command_queue.put_nowait(transcribed_text)  # Add command to the queue
-                        self.update_gui_with_transcription(transcribed_text)
-                    except Full:
-                        logger.warning("Command queue is full. Dropping command.")
+                    self._queue_command(transcribed_text)
+                    self.update_gui_with_transcription(transcribed_text)
 
             # Start the microphone for command recognition
             self.microphone_input.start_listening(command_callback)
@@ -122,26 +175,40 @@ class LunaVoiceSystem:
             self.command_processor_thread = threading.Thread(target=self.process_commands, daemon=True)
             self.command_processor_thread.start()
 
+    def _queue_command(self, transcribed_text):
+        """
+        Add a command (or the None stop sentinel) to the command queue and wake the command processor.
+        """
+        with self._command_ready:
+            if len(self.command_queue) == self.command_queue.maxlen:
+                logger.warning("Command queue is full. Dropping the oldest command.")
+            self.command_queue.append(transcribed_text)
+            self._command_ready.notify()
+
     def process_commands(self):
         """
         Process commands from the command queue in a background thread.
         Execute intents based on the transcribed text.
         """
         logger.info("Command processor thread started.")
-        while self.listening_for_commands:
+        while True:
+            with self._command_ready:
+                while not self.command_queue:
+                    self._command_ready.wait()  # Until a command or the stop sentinel arrives
+                transcribed_text = self.command_queue.popleft()
+            if transcribed_text is None:
+                break
             try:
-                transcribed_text = self.command_queue.get(timeout=0.5)  # Timeout to prevent blocking
-                logger.info(f"Processing command: {transcribed_text}")
+                logger.info("Processing command: %s", transcribed_text)
+                self._activity_event.set()
 
                 intent = self.recognize_intent(transcribed_text)
                 response = self.action_executor.execute_intent(intent, transcribed_text)
 
                 # Update the GUI with the response
                 self.update_gui_with_response(response)
-            except Empty:
-                continue  # Queue is empty, wait for the next command
             except Exception as e:
-                logger.error(f"Error processing command: {e}", exc_info=True)
+                logger.error("Error processing command: %s", e, exc_info=True)
 
         logger.info("Command processor thread ending.")
 
@@ -160,6 +227,9 @@ class LunaVoiceSystem:
             # Stop microphone listening
             self.microphone_input.stop_listening()
 
+            # Wake the command processor with the stop sentinel
+            self._queue_command(None)
+
             # Ensure the command processor thread has ended
             if self.command_processor_thread and self.command_processor_thread.is_alive():
                 logger.info("Waiting for command processor thread to terminate...")
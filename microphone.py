@@ -1,8 +1,9 @@
 # sensors/ears/microphone.py
-import queue
+import os
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 
 import numpy as np
 import sounddevice as sd
@@ -10,8 +11,180 @@ import speech_recognition as sr
 
 from utils.logger import Logger
 
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+try:
+    from faster_whisper import WhisperModel
+except ImportError:
+    WhisperModel = None  # Falls back to Google Speech Recognition on whole utterances
+
 logger = Logger()
 
+SAMPLE_RATE = 16000
+BLOCK_SIZE = 512  # Samples per audio callback (32 ms), one ring-buffer hop
+AUDIO_THREAD_PRIORITY = 10  # SCHED_FIFO priority requested for the audio callback thread
+WHISPER_MODEL = "base.en"
+MIN_CHUNK_SIZE = 1.0  # Seconds of new speech between streaming transcriptions
+END_OF_SPEECH = 0.8  # Seconds of silence that close an utterance
+PRE_SPEECH = 0.3  # Seconds of audio kept ahead of speech onset
+VAD_FRAME = int(SAMPLE_RATE * 0.03)  # webrtcvad accepts 10, 20 or 30 ms frames
+
+
+def raise_thread_priority():
+    """
+    Move the calling thread to real-time FIFO scheduling so audio callbacks keep a steady cadence.
+    Only supported on Linux; unprivileged processes keep the default scheduler.
+
+    Returns:
+        bool: Whether the priority was raised.
+    """
+    if not hasattr(os, "sched_setscheduler"):
+        return False
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(AUDIO_THREAD_PRIORITY))
+    except OSError:
+        return False
+    return True
+
+
+def to_pcm16(samples):
+    """
+    Convert float32 samples in [-1, 1] to int16 PCM, clipping anything out of range.
+    int16 input is returned unchanged.
+    """
+    if samples.dtype == np.int16:
+        return samples
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype(np.int16)
+
+
+def to_float32(samples, out=None):
+    """
+    Promote int16 PCM to float32 in [-1, 1) for consumers that need floats (noisereduce, Whisper).
+    When `out` is given, the result is written into its first len(samples) entries and that view is returned.
+    """
+    if out is None:
+        return samples.astype(np.float32) * (1.0 / 32768.0)
+    out = out[:len(samples)]
+    np.multiply(samples, 1.0 / 32768.0, out=out, casting='unsafe')
+    return out
+
+
+@dataclass
+class DspFrame:
+    """
+    One block of microphone audio with the per-block analysis computed once in the listening loop.
+    """
+    pcm: np.ndarray  # Raw int16 samples
+    rms: float  # Relative to full scale (0.0 to 1.0)
+    is_voice: bool
+    denoised: Future  # Resolves to noise-reduced float32 samples for voiced blocks, when requested; else None
+
+
+class AudioRingBuffer:
+    """
+    Fixed-size int16 ring holding the most recent microphone samples.
+    Written only from the PortAudio callback, without locks or allocation: samples are copied into the slab
+    first and the write counter is bumped last, so readers can tell afterwards whether the region they copied
+    was overwritten in the meantime. Readers wait on an event from `subscribe()`, which is set each time
+    another `hop` samples have arrived.
+    """
+
+    def __init__(self, capacity=SAMPLE_RATE * 5, hop=512, dtype=np.int16):
+        self._buffer = np.zeros(capacity, dtype=dtype)
+        self._written = 0  # Total samples written since creation
+        self._max_block = 0  # Largest single write, bounds what an in-progress write can overwrite
+        self._since_signal = 0
+        self._listeners = []
+        self.capacity = capacity
+        self.hop = hop
+
+    def subscribe(self):
+        """
+        Returns:
+            threading.Event: Event set after every `hop` new samples; the subscriber clears it.
+        """
+        event = threading.Event()
+        self._listeners.append(event)
+        return event
+
+    def write(self, samples):
+        """
+        Append 1-D samples, overwriting the oldest ones.
+        """
+        samples = samples[-self.capacity:]
+        n = len(samples)
+        self._max_block = max(self._max_block, n)
+        start = self._written % self.capacity
+        first = min(n, self.capacity - start)
+        np.copyto(self._buffer[start:start + first], samples[:first])
+        np.copyto(self._buffer[:n - first], samples[first:])
+        self._written += n  # Publish only after the copy
+
+        self._since_signal += n
+        if self._since_signal >= self.hop:
+            self._since_signal = 0
+            for event in self._listeners:
+                event.set()
+
+    @property
+    def position(self):
+        """Absolute position of the next sample to be written."""
+        return self._written
+
+    def _oldest_valid(self):
+        """Oldest position that no write, including one in progress, can be overwriting."""
+        return max(0, self._written + self._max_block - self.capacity)
+
+    def _copy(self, start, end, out):
+        """Copy absolute positions [start, end) into `out`, unwrapping the ring."""
+        begin = start % self.capacity
+        first = min(end - start, self.capacity - begin)
+        np.copyto(out[:first], self._buffer[begin:begin + first])
+        np.copyto(out[first:], self._buffer[:end - start - first])
+
+    def read_latest(self, out):
+        """
+        Copy the most recent samples into the tail of `out`, zero-filling the front if fewer are available.
+        `out` may be a wider dtype (e.g. float32); samples keep their int16 scale.
+
+        Returns:
+            int: Number of samples copied.
+        """
+        while True:
+            end = self._written
+            n = min(len(out), self.capacity - self._max_block, end)
+            self._copy(end - n, end, out[len(out) - n:])
+            if end - n >= self._oldest_valid():
+                break  # Nothing copied was overwritten; otherwise retry with the newer samples
+        out[:len(out) - n] = 0
+        return n
+
+    def read_since(self, position, out=None):
+        """
+        Copy every sample written after absolute `position`.
+        If the reader fell behind by more than the ring holds, the oldest samples are dropped.
+        With `out`, nothing is allocated: at most len(out) samples are copied into its front (keeping their
+        int16 scale if `out` is wider) and new_position tells where the next read continues.
+
+        Returns:
+            tuple: (samples, new_position, dropped) where dropped is the number of samples lost.
+        """
+        while True:
+            end = self._written
+            start = max(position, self._oldest_valid())
+            if out is None:
+                samples = np.empty(end - start, dtype=self._buffer.dtype)
+            else:
+                end = min(end, start + len(out))
+                samples = out[:end - start]
+            self._copy(start, end, samples)
+            if start >= self._oldest_valid():
+                return samples, end, start - position
+
+
 class MicrophoneInput:
     _instance = None
     _lock = threading.Lock()
@@ -32,7 +205,7 @@ class MicrophoneInput:
         Initializes the MicrophoneInput and sets up the speech recognizer and microphone stream.
         
         Args:
-            timeout (float): Timeout for audio queue operations.
+            timeout (float): Timeout for waiting on new audio.
             phrase_time_limit (float): Time limit for phrases.
             noise_adjustment_interval (int): Interval for adjusting to ambient noise.
         """
@@ -50,18 +223,37 @@ class MicrophoneInput:
         self.phrase_time_limit = phrase_time_limit
         self.noise_adjustment_interval = noise_adjustment_interval
         self.last_noise_adjustment_time = time.time()
-        self.audio_queue = queue.Queue(maxsize=50)
+        # Preallocated ring filled by the audio callback; read by speech-to-text and real-time consumers such as the GUI
+        self.audio_ring = AudioRingBuffer()
+        self._audio_ready = self.audio_ring.subscribe()
+        self._read_position = 0
+        self._overrun = False
+        self._dsp_subscribers = []
+        self._denoise_requested = False  # Whether any subscriber asked for DspFrame.denoised
+        self._noise_filter = None
+        self._noise_profile_due = True  # Record a noise profile on the next quiet block (see _listen_loop)
         self.stream = None
+        self._priority_set = False  # Whether the audio callback thread has tried to raise its priority
         self.executor = ThreadPoolExecutor(max_workers=1)
+
+        # Streaming speech-to-text state (see _process_new_audio)
+        self._vad = webrtcvad.Vad(2) if webrtcvad is not None else None
+        self._whisper = None
+        self._whisper_lock = threading.Lock()
+        self._reset_utterance()
+        if WhisperModel is not None:
+            threading.Thread(target=self._warm_up_whisper, daemon=True).start()
         self.initialized = True
         logger.info("MicrophoneInput initialized.")
 
-    def start_listening(self, local_callback):
+    def start_listening(self, local_callback, partial_callback=None):
         """
         Starts the microphone and begins listening for audio input, using a background thread for processing.
         
         Args:
-            local_callback (function): A callback function to invoke when transcribed audio is available.
+            local_callback (function): A callback function to invoke with the transcript of each utterance.
+            partial_callback (function): Optional callback invoked with confirmed words while an utterance is
+                still in progress (streaming Whisper only).
         """
         with self._lock:
             if not self.running:
@@ -71,23 +263,62 @@ class MicrophoneInput:
 
                 try:
                     # Set up the audio input stream
-                    self.stream = sd.InputStream(callback=self._audio_callback, channels=1, samplerate=16000)
+                    self._priority_set = False
+                    self.stream = sd.InputStream(callback=self._audio_callback, channels=1, samplerate=SAMPLE_RATE,
+                                                 dtype='int16', blocksize=BLOCK_SIZE, latency='low')
                     self.stream.start()
                     logger.info("Audio stream started successfully.")
                 except Exception as e:
-                    logger.error(f"Failed to open audio stream: {e}", exc_info=True)
+                    logger.error("Failed to open audio stream: %s", e, exc_info=True)
                     self.running = False
                     return
 
-                # Start a background thread to listen for audio
-                self.executor.submit(self._listen_loop, local_callback)
+                # Start a background thread to listen for audio, from the samples that arrive next
+                self._read_position = self.audio_ring.position
+                self.executor.submit(self._listen_loop, local_callback, partial_callback)
                 logger.info("Listening loop started in a background thread.")
             else:
                 logger.warning("Microphone is already running.")
 
+    def subscribe(self, callback, denoise=False):
+        """
+        Registers a callback that receives a DspFrame for every audio block the listening loop processes.
+
+        Args:
+            callback (function): Called with a DspFrame on the listening thread; keep it short.
+            denoise (bool): Whether the callback needs DspFrame.denoised. Noise reduction only runs, on the
+                noise filter's worker, while at least one subscriber asked for it.
+        """
+        self._dsp_subscribers.append(callback)
+        self._denoise_requested = self._denoise_requested or denoise
+
+    def set_noise_filter(self, noise_filter):
+        """
+        Sets the NoiseFilter used to fill DspFrame.denoised for voiced blocks. The listening loop records its
+        noise profile on the first quiet block and again after every periodic noise adjustment.
+
+        Args:
+            noise_filter (NoiseFilter): Filter whose reduce_noise_async is applied.
+        """
+        self._noise_filter = noise_filter
+        self._noise_profile_due = True
+
+    def _analyze_block(self, samples):
+        """
+        Single fused pass over a block: energy and voice activity. Voiced blocks are also handed to the noise
+        filter's worker when a subscriber asked for denoised audio, so the listening thread never waits on it.
+        """
+        energy = np.einsum('i,i->', samples, samples, dtype=np.int64)  # Accumulate without an int16 overflow
+        rms = float(np.sqrt(energy / len(samples))) / 32768.0
+        is_voice = self._is_speech(samples, rms)
+        denoised = None
+        if is_voice and self._denoise_requested and self._noise_filter is not None:
+            denoised = self._noise_filter.reduce_noise_async(to_float32(samples))
+        return DspFrame(pcm=samples, rms=rms, is_voice=is_voice, denoised=denoised)
+
     def _audio_callback(self, indata, frames, time, status):
         """
-        Callback function for audio input stream. Captures incoming audio and places it in the queue for processing.
+        Callback function for audio input stream. Copies incoming audio into the ring buffer for processing.
         
         Args:
             indata: The incoming audio data.
@@ -95,60 +326,215 @@ class MicrophoneInput:
             time: The timestamp for the audio data.
             status: Any status flags (e.g., underflow or overflow).
         """
+        if not self._priority_set:
+            # The callback runs on PortAudio's thread, so this is the first chance to reach it
+            self._priority_set = True
+            if not raise_thread_priority():
+                logger.debug("Could not raise the audio thread priority; using the default scheduler.")
         if status:
-            logger.warning(f"Stream status: {status}")
-        try:
-            self.audio_queue.put_nowait(indata.copy())
-        except queue.Full:
-            logger.warning("Audio queue is full. Dropping audio frame.")
+            logger.debug("Stream status: %s", status)
+        self.audio_ring.write(indata[:, 0])
 
-    def _listen_loop(self, callback):
+    def _listen_loop(self, callback, partial_callback=None):
         """
-        Background thread function that continuously processes audio from the queue for speech recognition.
+        Background thread function that continuously processes audio from the ring buffer for speech recognition.
         
         Args:
             callback (function): A callback function to invoke with transcribed text.
+            partial_callback (function): Optional callback for confirmed words of an utterance in progress.
         """
-        logger.info("Entering the listening loop...")
+        logger.debug("Entering the listening loop...")
         while self.running:
             # Adjust for noise periodically
             if time.time() - self.last_noise_adjustment_time > self.noise_adjustment_interval:
                 self.adjust_for_noise()
+                self._noise_profile_due = True
+
+            # Wait for the callback to deliver another hop of samples
+            if not self._audio_ready.wait(timeout=self.timeout or 0.5):
+                continue
+            self._audio_ready.clear()
+
+            # Take everything written since the last read so the recognizer sees one contiguous block
+            samples, self._read_position, dropped = self.audio_ring.read_since(self._read_position)
+            if dropped and not self._overrun:
+                logger.warning("Speech recognition fell behind; dropped %s audio samples.", dropped)
+            self._overrun = dropped > 0
+            if len(samples) == 0:
+                continue
 
             try:
-                audio_data = self.audio_queue.get(timeout=self.timeout)
-            except queue.Empty:
+                frame = self._analyze_block(samples)
+                if self._noise_profile_due and self._noise_filter is not None \
+                        and not frame.is_voice and not self._in_speech:
+                    # Refresh the noise filter's profile from ambient audio, outside of any utterance
+                    self._noise_filter.adjust_for_noise()
+                    self._noise_profile_due = False
+                for subscriber in self._dsp_subscribers:
+                    subscriber(frame)
+                partial_text, transcribed_text = self._process_new_audio(frame)
+            except Exception as e:
+                logger.error("Speech recognition failed: %s", e, exc_info=True)
+                self._reset_utterance()
                 continue
 
-            transcribed_text = self.process_audio_for_speech_to_text(audio_data)
+            if partial_text and partial_callback:
+                partial_callback(partial_text)
             if transcribed_text:
                 callback(transcribed_text)
 
         logger.info("Exiting the listening loop.")
 
+    def _reset_utterance(self):
+        """
+        Clear the rolling audio buffer and LocalAgreement state for the next utterance.
+        """
+        self._buffer = np.zeros(0, dtype=np.int16)
+        self._in_speech = False
+        self._silence = 0.0
+        self._since_transcribe = 0
+        self._hypothesis = []  # Unconfirmed words from the last streaming pass
+        self._committed = []  # Confirmed words of the current utterance
+        self._prompt = ""
+
+    def _is_speech(self, samples, rms):
+        """
+        Check a block of int16 samples for speech with webrtcvad, or an energy gate on its RMS without it.
+        """
+        if self._vad is None:
+            return rms > 0.01
+        for start in range(0, len(samples) - VAD_FRAME + 1, VAD_FRAME):
+            if self._vad.is_speech(samples[start:start + VAD_FRAME].tobytes(), SAMPLE_RATE):
+                return True
+        return False
+
+    def _process_new_audio(self, frame):
+        """
+        Append a new block to the rolling buffer and run the VAD-gated recognizer.
+        Silence before speech is never sent to the recognizer. While speech continues, streaming Whisper
+        runs every MIN_CHUNK_SIZE seconds of new audio; the utterance is finalized after END_OF_SPEECH
+        seconds of silence.
+
+        Returns:
+            tuple: (newly confirmed partial text or None, full utterance transcript or None).
+        """
+        samples = frame.pcm
+        self._buffer = np.concatenate((self._buffer, samples))
+        if frame.is_voice:
+            self._in_speech = True
+            self._silence = 0.0
+        elif self._in_speech:
+            self._silence += len(samples) / SAMPLE_RATE
+        else:
+            # Nothing said yet: keep only a short lead-in
+            self._buffer = self._buffer[-int(PRE_SPEECH * SAMPLE_RATE):]
+            return None, None
+
+        if self._silence >= END_OF_SPEECH:
+            return None, self._finish_utterance()
+
+        self._since_transcribe += len(samples)
+        if WhisperModel is not None and self._since_transcribe >= MIN_CHUNK_SIZE * SAMPLE_RATE:
+            return self._transcribe_streaming(), None
+        return None, None
+
+    def _get_whisper(self):
+        """
+        Load the Whisper model on first use.
+        """
+        with self._whisper_lock:
+            if self._whisper is None:
+                self._whisper = WhisperModel(WHISPER_MODEL, device="auto", compute_type="int8")
+                logger.info("Loaded Whisper model '%s'.", WHISPER_MODEL)
+        return self._whisper
+
+    def _warm_up_whisper(self):
+        """
+        Load the Whisper model and run it once on silence in the background, so the first utterance
+        does not pay for model loading and the first inference call.
+        """
+        try:
+            segments, _ = self._get_whisper().transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), language="en")
+            for _ in segments:  # Segments are generated lazily; consume them to run the decoder
+                pass
+        except Exception as e:
+            logger.warning("Whisper warm-up failed: %s", e)
+
+    def _transcribe_streaming(self):
+        """
+        One LocalAgreement-2 step: transcribe the buffer, confirm the longest prefix shared with the previous
+        hypothesis and trim the confirmed audio from the buffer.
+
+        Returns:
+            str: Newly confirmed text, or None if nothing new was confirmed.
+        """
+        self._since_transcribe = 0
+        segments, _ = self._get_whisper().transcribe(
+            to_float32(self._buffer), language="en", word_timestamps=True,
+            initial_prompt=self._prompt or None, condition_on_previous_text=False,
+        )
+        words = [(word.end, word.word) for segment in segments for word in segment.words]
+
+        agreed = 0
+        for (_, new_word), (_, old_word) in zip(words, self._hypothesis):
+            if new_word.strip().lower() != old_word.strip().lower():
+                break
+            agreed += 1
+        self._hypothesis = words[agreed:]
+        if agreed == 0:
+            return None
+
+        # Cut the buffer at the end of the last confirmed word; later words stay as hypothesis
+        confirmed = words[:agreed]
+        self._buffer = self._buffer[int(confirmed[-1][0] * SAMPLE_RATE):]
+        self._committed.extend(word for _, word in confirmed)
+
+        text = "".join(word for _, word in confirmed).strip()
+        self._prompt = "".join(self._committed)[-200:]
+        return text
+
+    def _finish_utterance(self):
+        """
+        Transcribe whatever is left of the utterance and reset the streaming state.
+
+        Returns:
+            str: Transcript of the whole utterance, or None if nothing was recognized.
+        """
+        try:
+            if WhisperModel is not None:
+                segments, _ = self._get_whisper().transcribe(
+                    to_float32(self._buffer), language="en", initial_prompt=self._prompt or None,
+                )
+                text = ("".join(self._committed) + "".join(segment.text for segment in segments)).strip()
+                if text:
+                    logger.debug("Transcribed text: %s", text)
+                return text or None
+            return self.process_audio_for_speech_to_text(self._buffer)
+        finally:
+            self._reset_utterance()
+
     def process_audio_for_speech_to_text(self, audio_data):
         """
         Processes audio data using Google's SpeechRecognition for speech-to-text conversion.
         
         Args:
-            audio_data: The audio data from the microphone input.
+            audio_data (numpy.ndarray): int16 (or float32) audio samples from the microphone input.
         
         Returns:
             str: Transcribed text, or None if no transcription is available.
         """
         try:
-            # Convert audio data to the correct format for Google Speech Recognition
-            audio_data = np.frombuffer(audio_data, dtype=np.float32)
-            audio_data = sr.AudioData(audio_data.tobytes(), 16000, 2)
+            # Google Speech Recognition expects 16-bit PCM, which is what the microphone captures
+            audio_data = sr.AudioData(to_pcm16(audio_data).tobytes(), SAMPLE_RATE, 2)
             
             # Perform speech recognition
             text = self.recognizer.recognize_google(audio_data, show_all=False)
-            logger.info(f"Transcribed text: {text}")
+            logger.debug("Transcribed text: %s", text)
             return text
         except sr.UnknownValueError:
             logger.warning("Google Speech Recognition could not understand the audio.")
         except sr.RequestError as e:
-            logger.error(f"Could not request results from Google Speech Recognition service: {e}")
+            logger.error("Could not request results from Google Speech Recognition service: %s", e)
         return None
 
     def stop_listening(self):
@@ -167,6 +553,21 @@ class MicrophoneInput:
                 self.executor.shutdown(wait=False)
                 logger.info("Microphone stopped listening.")
 
+    def capture_audio_float32(self, out):
+        """
+        Copy the most recent len(out) samples from the ring buffer into a preallocated float32 array,
+        scaled to [-1, 1), without allocating. Fewer samples may be available right after start-up.
+
+        Args:
+            out (numpy.ndarray): float32 destination; the samples fill its tail.
+
+        Returns:
+            int: Number of samples captured (the last n entries of `out`).
+        """
+        n = self.audio_ring.read_latest(out)
+        out *= 1.0 / 32768.0
+        return n
+
     def adjust_for_noise(self):
         """
         Adjusts the recognizer's energy threshold for ambient noise.
@@ -175,3 +576,17 @@ class MicrophoneInput:
         with self.recognizer as source:
             self.recognizer.adjust_for_ambient_noise(source, duration=1)
         self.last_noise_adjustment_time = time.time()
+
+
+_microphone = None  # Shared MicrophoneInput, created by the first get_microphone() call
+
+
+def get_microphone():
+    """
+    Return the process-wide MicrophoneInput, creating it on first use.
+    Modules that only need the shared microphone call this instead of re-running MicrophoneInput().
+    """
+    global _microphone
+    if _microphone is None:
+        _microphone = MicrophoneInput()
+    return _microphone
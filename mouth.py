@@ -1,39 +1,79 @@
 # sensors/mouth/mouth.py
+import functools
+import os
 import queue
 import threading
 
+import numpy as np
 import pyttsx3
+import sounddevice as sd
 
 from utils.logger import Logger
 
+try:
+    from piper import PiperVoice
+except ImportError:
+    PiperVoice = None  # Falls back to pyttsx3
+
 logger = Logger()
 
+PIPER_VOICE_PATH = os.path.join(os.path.dirname(__file__), "en_US-lessac-medium.onnx")
+PIPER_BASE_RATE = 160  # Words per minute Piper speaks at length_scale 1.0
+
+
+@functools.lru_cache(maxsize=None)
+def _get_piper_voice(piper_voice_path):
+    """
+    Load a Piper voice model on first use and share it process-wide; rate and volume are applied per Mouth.
+    """
+    return PiperVoice.load(piper_voice_path)
+
+
 class Mouth:
-    def __init__(self, rate=160, volume=0.8, voice_index=1):
+    def __init__(self, rate=160, volume=0.8, voice_index=1, piper_voice_path=PIPER_VOICE_PATH):
         """
         Initialize the Mouth class with the specified speech rate, volume, and voice.
+        Uses a streaming Piper voice when piper-tts and the voice model are available, otherwise pyttsx3.
         :param rate: Speech rate in words per minute.
         :param volume: Volume level (0.0 to 1.0).
-        :param voice_index: Index of the voice to use.
+        :param voice_index: Index of the voice to use (pyttsx3 only).
+        :param piper_voice_path: Path to the Piper voice model (.onnx with its .onnx.json config).
         """
-        self.engine = pyttsx3.init()
+        self.voice = None
+        self.engine = None
+        if PiperVoice is not None and os.path.exists(piper_voice_path):
+            self.voice = _get_piper_voice(piper_voice_path)
+            self.output_stream = None  # Opened on first use and kept open
+        else:
+            self.engine = pyttsx3.init()
         self.set_rate(rate)
         self.set_volume(volume)
         self.set_voice(voice_index)
         self.speech_queue = queue.Queue()  # Queue to hold speech tasks
+        self._speaking = threading.Event()
+        self._interrupt = threading.Event()
+        # One long-lived worker owns the engine (pyttsx3 must stay on a single thread); it warms the engine up first
         self.processing_thread = threading.Thread(target=self._process_speech_queue, daemon=True)
-        self.processing_thread.start()  # Start the background processing thread
+        self.processing_thread.start()
 
     def set_rate(self, rate):
         """Set the speech rate."""
-        self.engine.setProperty('rate', rate)
+        if self.voice is not None:
+            self._length_scale = PIPER_BASE_RATE / rate
+        else:
+            self.engine.setProperty('rate', rate)
 
     def set_volume(self, volume):
         """Set the volume level."""
-        self.engine.setProperty('volume', volume)
+        if self.voice is not None:
+            self._volume = volume
+        else:
+            self.engine.setProperty('volume', volume)
 
     def set_voice(self, voice_index):
         """Set the voice by index."""
+        if self.voice is not None:
+            return  # A Piper model has a single voice
         voices = self.engine.getProperty('voices')
         voice_id = voices[voice_index].id if 0 <= voice_index < len(voices) else voices[1].id
         self.engine.setProperty('voice', voice_id)
@@ -43,23 +83,65 @@ class Mouth:
         logger.info(f"Queuing speech: {text}")
         self.speech_queue.put(text)
 
+    def _warm_up(self):
+        """Run the engine once without output so the first real utterance skips its cold start."""
+        try:
+            if self.voice is not None:
+                self._open_output_stream()
+                for _ in self.voice.synthesize_stream_raw("Hello.", length_scale=self._length_scale):
+                    pass
+            else:
+                self.engine.say("")
+                self.engine.runAndWait()
+        except Exception as e:
+            logger.warning(f"Speech engine warm-up failed: {e}")
+
     def _process_speech_queue(self):
-        """Continuously process the speech queue in a separate thread."""
+        """Speak queued text on the worker thread, blocking while the queue is empty."""
+        self._warm_up()
         while True:
             text = self.speech_queue.get()
             if text:
+                self._speaking.set()
+                self._interrupt.clear()
                 try:
                     logger.info(f"Speaking: {text}")
-                    self.engine.say(text)
-                    self.engine.runAndWait()  # Block until speech is finished
+                    if self.voice is not None:
+                        self._speak_streaming(text)
+                    else:
+                        self.engine.say(text)
+                        self.engine.runAndWait()  # Block until speech is finished
                 except Exception as e:
                     logger.error(f"Error during speech: {e}")
+                finally:
+                    self._speaking.clear()
             self.speech_queue.task_done()
 
+    def _speak_streaming(self, text):
+        """Play Piper audio chunk by chunk as it is synthesized."""
+        self._open_output_stream()
+        for chunk in self.voice.synthesize_stream_raw(text, length_scale=self._length_scale):
+            if self._interrupt.is_set():
+                break
+            samples = np.frombuffer(chunk, dtype=np.int16).astype(np.float32)
+            samples *= self._volume / 32768.0
+            self.output_stream.write(samples)
+
+    def _open_output_stream(self):
+        """Open the Piper output stream on first use and keep it open."""
+        if self.output_stream is None:
+            self.output_stream = sd.OutputStream(samplerate=self.voice.config.sample_rate, channels=1, dtype='float32')
+            self.output_stream.start()
+
     def is_speaking(self):
         """Check if the engine is currently speaking."""
+        if self.voice is not None:
+            return self._speaking.is_set()
         return self.engine.isBusy()
 
     def stop(self):
         """Stop the speech engine safely."""
-        self.engine.stop()
+        if self.voice is not None:
+            self._interrupt.set()
+        else:
+            self.engine.stop()
@@ -1,11 +1,47 @@
 # sensors/ears/noise_filter.py
+from concurrent.futures import ThreadPoolExecutor
+
 import noisereduce as nr
 import numpy as np
-from sensors.ears.microphone import MicrophoneInput
+import speech_recognition as sr
+from numba import njit
+from sensors.ears.microphone import get_microphone
 from utils.logger import Logger
 
 logger = Logger()
 
+
+@njit(cache=True, fastmath=True)
+def _mean_abs(samples):
+    """
+    Mean absolute value in a single pass, without materializing |samples|.
+    Numba compiles one specialization per dtype (int16 microphone PCM and AudioData, float32 processed audio).
+    """
+    total = 0.0
+    for i in range(samples.size):
+        total += abs(np.float64(samples[i]))
+    return total / samples.size if samples.size else 0.0
+
+
+def mean_abs_amplitude(audio_data):
+    """
+    Calculates the mean absolute amplitude of audio data.
+
+    Args:
+        audio_data (speech_recognition.AudioData or numpy.ndarray): The audio data to process.
+
+    Returns:
+        float: The mean absolute amplitude.
+    """
+    if isinstance(audio_data, sr.AudioData):
+        samples = np.frombuffer(audio_data.get_raw_data(), dtype=np.int16)
+    elif isinstance(audio_data, np.ndarray):
+        samples = audio_data.ravel()
+    else:
+        raise TypeError("audio_data must be either speech_recognition.AudioData or numpy.ndarray")
+    return _mean_abs(samples)
+
+
 class NoiseFilter:
     def __init__(self, noise_reduction_factor=0.9, stationary=False, freq_mask_smooth_hz=500, time_mask_smooth_ms=100):
         """
@@ -21,9 +57,28 @@ class NoiseFilter:
         self.stationary = stationary
         self.freq_mask_smooth_hz = freq_mask_smooth_hz
         self.time_mask_smooth_ms = time_mask_smooth_ms
-        self.microphone_input = MicrophoneInput()  # Using MicrophoneInput for audio capture
+        self.microphone_input = get_microphone()  # Shared MicrophoneInput for audio capture
+        self._noise_clip = None  # Ambient noise profile recorded by adjust_for_noise
+        self._executor = ThreadPoolExecutor(max_workers=1)  # Keeps noise reduction off the listening loop
         logger.info("Advanced Noise Filter initialized.")
 
+    def adjust_for_noise(self, duration=1.0):
+        """
+        Records the latest `duration` seconds of ambient audio from the microphone ring buffer as the
+        noise profile; later calls to reduce_noise reuse it instead of re-estimating noise each time.
+
+        Args:
+            duration (float): Seconds of ambient audio to record.
+        """
+        noise_clip = np.empty(int(16000 * duration), dtype=np.float32)
+        captured = self.microphone_input.audio_ring.read_latest(noise_clip)
+        if captured == 0:
+            logger.warning("No ambient audio available for the noise profile.")
+            return
+        noise_clip *= 1.0 / 32768.0  # int16 scale to the float range reduce_noise receives
+        self._noise_clip = noise_clip[len(noise_clip) - captured:]
+        logger.info("Recorded a %.2f s noise profile.", captured / 16000)
+
     def reduce_noise(self, audio_data):
         """
         Reduces noise from the provided audio data using advanced noise reduction techniques.
@@ -35,17 +90,38 @@ class NoiseFilter:
             numpy.ndarray: The noise-reduced audio data.
         """
         try:
-            reduced_noise = nr.reduce_noise(y=audio_data, sr=16000, 
-                                            prop_decrease=self.noise_reduction_factor, 
-                                            stationary=self.stationary,
-                                            freq_mask_smooth_hz=self.freq_mask_smooth_hz,
-                                            time_mask_smooth_ms=self.time_mask_smooth_ms)
-            logger.info("Noise reduction successful.")
+            if self._noise_clip is not None:
+                # Stationary reduction against the recorded profile, processed in 1 s overlapping blocks
+                reduced_noise = nr.reduce_noise(y=audio_data, sr=16000, y_noise=self._noise_clip,
+                                                prop_decrease=self.noise_reduction_factor,
+                                                stationary=True, n_fft=512, hop_length=128,
+                                                chunk_size=16000, padding=1024,
+                                                freq_mask_smooth_hz=self.freq_mask_smooth_hz,
+                                                time_mask_smooth_ms=self.time_mask_smooth_ms)
+            else:
+                reduced_noise = nr.reduce_noise(y=audio_data, sr=16000,
+                                                prop_decrease=self.noise_reduction_factor,
+                                                stationary=self.stationary,
+                                                freq_mask_smooth_hz=self.freq_mask_smooth_hz,
+                                                time_mask_smooth_ms=self.time_mask_smooth_ms)
+            logger.debug("Noise reduction successful.")
             return reduced_noise
         except Exception as e:
-            logger.error(f"Error reducing noise: {e}")
+            logger.error("Error reducing noise: %s", e)
             return audio_data
 
+    def reduce_noise_async(self, audio_data):
+        """
+        Runs reduce_noise on the filter's background worker.
+
+        Args:
+            audio_data (numpy.ndarray): The raw audio data captured from the microphone.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the noise-reduced audio data.
+        """
+        return self._executor.submit(self.reduce_noise, audio_data)
+
     def capture_and_reduce_noise(self):
         """
         Captures audio using the microphone and applies noise reduction.
@@ -58,7 +134,7 @@ class NoiseFilter:
             reduced_audio = self.reduce_noise(audio_data)
             return reduced_audio
         except Exception as e:
-            logger.error(f"Error capturing and reducing noise: {e}")
+            logger.error("Error capturing and reducing noise: %s", e)
             return None
         
     def calculate_amplitude_reduction(self, audio_data):
@@ -71,22 +147,9 @@ class NoiseFilter:
         Returns:
             float: The amplitude reduction factor.
         """
-        if isinstance(audio_data, sr.AudioData):
-            original_amplitude = np.mean(np.abs(np.frombuffer(audio_data.get_raw_data(), dtype=np.int16)))
-        elif isinstance(audio_data, np.ndarray):
-            original_amplitude = np.mean(np.abs(audio_data))
-        else:
-            raise TypeError("audio_data must be either speech_recognition.AudioData or numpy.ndarray")
-
-        filtered_audio = self.reduce_noise(audio_data)
-
-        if isinstance(filtered_audio, sr.AudioData):
-            filtered_amplitude = np.mean(np.abs(np.frombuffer(filtered_audio.get_raw_data(), dtype=np.int16)))
-        elif isinstance(filtered_audio, np.ndarray):
-            filtered_amplitude = np.mean(np.abs(filtered_audio))
-        else:
-            raise TypeError("filtered_audio must be either speech_recognition.AudioData or numpy.ndarray")
-        
+        original_amplitude = mean_abs_amplitude(audio_data)
+        filtered_amplitude = mean_abs_amplitude(self.reduce_noise(audio_data))
+
         if original_amplitude == 0:
             return 0
 
@@ -103,9 +166,17 @@ class NoiseFilter:
         Returns:
             float: The amplitude of the audio data.
         """
-        if isinstance(audio_data, sr.AudioData):
-            return np.mean(np.abs(np.frombuffer(audio_data.get_raw_data(), dtype=np.int16)))
-        elif isinstance(audio_data, np.ndarray):
-            return np.mean(np.abs(audio_data))
-        else:
-            raise TypeError("audio_data must be either speech_recognition.AudioData or numpy.ndarray")
+        return mean_abs_amplitude(audio_data)
+
+
+_noise_filter = None  # Shared NoiseFilter, created by the first get_noise_filter() call
+
+
+def get_noise_filter():
+    """
+    Return the process-wide NoiseFilter, creating it on first use so its noise profile and worker are shared.
+    """
+    global _noise_filter
+    if _noise_filter is None:
+        _noise_filter = NoiseFilter()
+    return _noise_filter
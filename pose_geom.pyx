@@ -0,0 +1,50 @@
+# brain/sensory_inputs/visual/pose_geom.pyx
+# cython: boundscheck=False, wraparound=False, language_level=3
+#
+# Native posture classifier for headless deployments (Jetson, Raspberry Pi).
+# Build in place with:  cythonize -i pose_geom.pyx
+# BodyLanguageAnalysis picks the compiled module up automatically and falls
+# back to the Numba kernel when it has not been built.
+from libc.math cimport fabsf
+
+# BlazePose landmark indices (must match body_language_analysis.py)
+cdef enum:
+    LEFT_SHOULDER = 11
+    RIGHT_SHOULDER = 12
+    LEFT_ELBOW = 13
+    RIGHT_ELBOW = 14
+    LEFT_WRIST = 15
+    RIGHT_WRIST = 16
+
+# Bit flags (must match body_language_analysis.py)
+cdef enum:
+    ARMS_RAISED = 1 << 0
+    ARMS_CROSSED = 1 << 1
+    SHOULDERS_TILTED = 1 << 2
+
+
+cpdef unsigned int classify(const float[:, ::1] soa) noexcept nogil:
+    """
+    Evaluate every posture check without holding the GIL.
+
+    Parameters:
+    - soa: C-contiguous (3, 33) float32 buffer with x, y and z rows of normalized landmarks.
+
+    Returns:
+    - int: Bitmask of ARMS_RAISED, ARMS_CROSSED and SHOULDERS_TILTED.
+    """
+    cdef unsigned int flags = 0
+
+    # Wrists above shoulders (y-coordinate in image, smaller is higher)
+    if soa[1, LEFT_WRIST] < soa[1, LEFT_SHOULDER] and soa[1, RIGHT_WRIST] < soa[1, RIGHT_SHOULDER]:
+        flags |= ARMS_RAISED
+
+    # Wrists positioned in front of the chest (crossing over)
+    if soa[0, LEFT_WRIST] > soa[0, RIGHT_ELBOW] and soa[0, RIGHT_WRIST] < soa[0, LEFT_ELBOW]:
+        flags |= ARMS_CROSSED
+
+    # Significant difference between the shoulders' y-coordinates
+    if fabsf(soa[1, LEFT_SHOULDER] - soa[1, RIGHT_SHOULDER]) > 0.1:
+        flags |= SHOULDERS_TILTED
+
+    return flags
@@ -1,12 +1,22 @@
 # brain/sensory_inputs/auditory/sound_analysis.py
+import time
+from collections import deque, namedtuple
+
 import numpy as np
-from sensors.ears.microphone import MicrophoneInput
-from brain.sensory_inputs.auditory.noise_filter import NoiseFilter
+from sensors.ears.microphone import SAMPLE_RATE, get_microphone
+from brain.sensory_inputs.auditory.noise_filter import get_noise_filter, mean_abs_amplitude
 from brain.sensory_inputs.auditory.vad import VoiceActivityDetection
 from utils.logger import Logger
 
 logger = Logger()
 
+SUMMARY_INTERVAL = 1.0  # Seconds of audio folded into each long-term summary
+SUMMARY_HISTORY = 3600  # Summaries kept, one hour at the default interval
+SPECTRUM_SIZE = 512  # FFT length used for the spectral centroid
+
+# Long-term record of one summary interval: level in dB, whether any voice was heard and the spectral centroid in Hz
+Summary = namedtuple("Summary", ["ts", "rms_db", "is_voice", "spectral_centroid"])
+
 class SoundAnalysis:
     def __init__(self, noisy_threshold=50):
         """
@@ -15,13 +25,19 @@ class SoundAnalysis:
         Args:
             noisy_threshold (int): Threshold above which the environment is considered noisy.
         """
-        self.microphone_input = MicrophoneInput()
-        self.noise_filter = NoiseFilter()
+        self.microphone_input = get_microphone()
+        self.noise_filter = get_noise_filter()
         self.vad = VoiceActivityDetection()
         self.noisy_threshold = noisy_threshold
         self.sound_level = 0
         self.is_noisy = False
-        self.audio_data_store = []  # Store audio data for deeper analysis over time
+        self.audio_data_store = deque(maxlen=SUMMARY_HISTORY)  # Per-interval Summary records, oldest dropped first
+        self._freqs = np.fft.rfftfreq(SPECTRUM_SIZE, 1 / SAMPLE_RATE)
+        self._reset_interval(time.time())
+
+        # Sound levels come from the microphone's per-block DSP pass instead of re-reading the audio
+        self.microphone_input.set_noise_filter(self.noise_filter)
+        self.microphone_input.subscribe(self.on_dsp_frame)
         logger.info("Advanced Sound Analysis initialized.")
 
     def calculate_sound_level(self, audio_data):
@@ -29,45 +45,95 @@ class SoundAnalysis:
         Calculate the sound level of the given audio data in decibels.
         
         Args:
-            audio_data (numpy.ndarray): The raw audio data.
+            audio_data (numpy.ndarray): The raw audio data (int16 PCM or float32).
             
         Returns:
             float: The sound level in dB.
         """
-        amplitude = np.mean(np.abs(audio_data))
+        amplitude = mean_abs_amplitude(audio_data)
+        if audio_data.dtype == np.int16:
+            amplitude /= 32768.0  # Same full-scale reference as float audio
         sound_level = 20 * np.log10(amplitude) if amplitude > 0 else 0
-        logger.info(f"Calculated sound level: {sound_level} dB")
+        logger.debug("Calculated sound level: %.1f dB", sound_level)
         return sound_level
 
+    def on_dsp_frame(self, frame):
+        """
+        Updates the sound level from a DspFrame published by the microphone's listening loop.
+
+        Args:
+            frame (DspFrame): Analysis of the latest audio block.
+        """
+        self.sound_level = 20 * np.log10(frame.rms) if frame.rms > 0 else 0
+        self.is_noisy = self.sound_level > self.noisy_threshold
+
+        # Fold the block into the running interval summary
+        samples = len(frame.pcm)
+        self._energy += frame.rms * frame.rms * samples
+        self._samples += samples
+        self._voiced = self._voiced or frame.is_voice
+        self._spectrum += np.abs(np.fft.rfft(frame.pcm, n=SPECTRUM_SIZE))
+
+        now = time.time()
+        if now - self._interval_start >= SUMMARY_INTERVAL:
+            self._store_summary(now)
+
+    def _reset_interval(self, now):
+        """
+        Clears the running sums for a new summary interval.
+        """
+        self._interval_start = now
+        self._energy = 0.0
+        self._samples = 0
+        self._voiced = False
+        self._spectrum = np.zeros(SPECTRUM_SIZE // 2 + 1)
+
+    def _store_summary(self, now):
+        """
+        Appends a Summary of the current interval to audio_data_store and starts the next interval.
+        """
+        rms = np.sqrt(self._energy / self._samples) if self._samples else 0.0
+        rms_db = 20 * np.log10(rms) if rms > 0 else 0
+        magnitude = self._spectrum.sum()
+        centroid = float(self._freqs @ self._spectrum / magnitude) if magnitude > 0 else 0.0
+        self.audio_data_store.append(Summary(self._interval_start, rms_db, self._voiced, centroid))
+        self._reset_interval(now)
+
     def analyze_sound(self):
         """
         Analyzes the sound level in the environment and checks if the environment is noisy.
+        Uses the level of the latest block processed by the microphone's listening loop.
         """
         logger.info("Starting sound analysis...")
-        audio_data = self.microphone_input.start_listening(lambda x: x)
-
-        # Apply noise reduction
-        cleaned_audio = self.noise_filter.reduce_noise(audio_data)
-
-        # Calculate sound level
-        self.sound_level = self.calculate_sound_level(cleaned_audio)
 
         # Analyze if the environment is noisy
-        if self.sound_level > self.noisy_threshold:
-            self.is_noisy = True
-            logger.info(f"Environment is noisy. Sound level: {self.sound_level} dB.")
+        if self.is_noisy:
+            logger.info("Environment is noisy. Sound level: %s dB.", self.sound_level)
         else:
-            self.is_noisy = False
-            logger.info(f"Environment is calm. Sound level: {self.sound_level} dB.")
+            logger.info("Environment is calm. Sound level: %s dB.", self.sound_level)
 
     def long_term_environment_analysis(self):
         """
-        Stores sound data over time and analyzes long-term noise patterns.
+        Analyzes long-term noise patterns from the per-interval summaries collected by on_dsp_frame.
+
+        Returns:
+            dict: Mean level in dB, fraction of noisy and voiced intervals, mean spectral centroid in Hz
+                and the number of intervals covered, or None if nothing has been recorded yet.
         """
         logger.info("Starting long-term sound analysis...")
-        while True:
-            audio_data = self.microphone_input.start_listening(lambda x: x)
-            self.audio_data_store.append(audio_data)
+        summaries = list(self.audio_data_store)
+        if not summaries:
+            logger.info("No long-term sound data recorded yet.")
+            return None
 
-            # Perform deeper analysis over time here if necessary
-            # Example: detecting patterns in noisy environments over time
+        levels = np.array([summary.rms_db for summary in summaries])
+        analysis = {
+            "mean_level": float(levels.mean()),
+            "noisy_fraction": float(np.mean(levels > self.noisy_threshold)),
+            "voice_fraction": float(np.mean([summary.is_voice for summary in summaries])),
+            "mean_centroid": float(np.mean([summary.spectral_centroid for summary in summaries])),
+            "intervals": len(summaries),
+        }
+        logger.info("Long-term sound analysis over %d intervals: mean level %.1f dB, %.0f%% noisy.",
+                    analysis["intervals"], analysis["mean_level"], 100 * analysis["noisy_fraction"])
+        return analysis
@@ -0,0 +1,49 @@
+import os
+from threading import Event
+
+import numpy as np
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+
+from gui import AudioThread, NebulaNetwork
+
+
+class QuietRing:
+    """Audio ring stand-in that serves one frame of low-level room noise, then stops the thread."""
+
+    def __init__(self, stop_event):
+        self.stop_event = stop_event
+
+    def subscribe(self):
+        new_samples = Event()
+        new_samples.set()
+        return new_samples
+
+    def read_latest(self, out):
+        # Roughly -50 dBFS of noise in the ring's int16 scale
+        out[:] = np.random.default_rng(0).normal(0, 100, len(out)).astype(np.int16)
+        self.stop_event.set()
+        return len(out)
+
+
+class QuietMicrophone:
+    def __init__(self, stop_event):
+        self.audio_ring = QuietRing(stop_event)
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def test_quiet_signal_keeps_particles_at_rest(app):
+    network = NebulaNetwork()
+    stop_event = Event()
+    AudioThread(QuietMicrophone(stop_event), network, stop_event).run()
+    network.move_particles()
+
+    assert not network.active_all
+    assert network.color_idx == 0
+    assert np.all(network.size == 2)
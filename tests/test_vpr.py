@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("librosa")
+
+from sensors.ears.vpr import NEAREST_PROFILE_MAX_DISTANCE, VoiceProfileRecognition
+
+
+def recognizer_with_profiles(profiles):
+    # Skip __init__, which opens the microphone; nearest_profile only needs the stored features
+    recognizer = VoiceProfileRecognition.__new__(VoiceProfileRecognition)
+    recognizer._X = np.asarray(profiles, dtype=np.float32)
+    recognizer._y = np.arange(len(profiles))
+    return recognizer
+
+
+def test_impostor_is_rejected_with_a_single_enrolled_profile():
+    enrolled = np.random.default_rng(0).normal(0, 20, 13).astype(np.float32)
+    recognizer = recognizer_with_profiles([enrolled])
+
+    impostor = enrolled + 2 * NEAREST_PROFILE_MAX_DISTANCE / np.sqrt(13)
+    label, confidence = recognizer.nearest_profile(impostor)
+
+    assert label == 0
+    assert confidence == 0.0
+
+
+def test_enrolled_speaker_keeps_a_high_confidence():
+    enrolled = np.random.default_rng(0).normal(0, 20, 13).astype(np.float32)
+    recognizer = recognizer_with_profiles([enrolled])
+
+    label, confidence = recognizer.nearest_profile(enrolled + 0.5)
+
+    assert label == 0
+    assert confidence > 0.8
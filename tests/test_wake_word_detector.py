@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from brain.sensory_inputs.auditory import wake_word_detector
+from brain.sensory_inputs.auditory.wake_word_detector import WakeWordDetector
+
+
+class SilentMouth:
+    def speak(self, text):
+        pass
+
+
+@pytest.fixture(params=["automaton", "fallback"])
+def detector(request, tmp_path, monkeypatch):
+    if request.param == "fallback":
+        monkeypatch.setattr(wake_word_detector, "ahocorasick", None)
+    elif wake_word_detector.ahocorasick is None:
+        pytest.skip("pyahocorasick is not installed")
+    monkeypatch.setattr(wake_word_detector, "Mouth", SilentMouth)
+    config_file = tmp_path / "react_keys.json"
+    config_file.write_text(json.dumps({
+        "wake_words": ["hey luna", "luna"],
+        "sleep_words": ["goodbye luna", "sleep"],
+        "wake_responses": ["Yes?"],
+        "sleep_responses": ["Goodbye."],
+    }))
+    return WakeWordDetector(microphone_input=None, config_file=str(config_file))
+
+
+def test_sleep_phrase_containing_wake_word_is_a_sleep_word(detector):
+    assert detector.detect_wake_word("goodbye luna") == (False, 1.0, "goodbye luna")
+
+
+def test_longest_wake_word_wins_over_more_frequent_shorter_one(detector):
+    detector._word_hits["luna"] += 10
+    detector._prepare_words()
+    assert detector.detect_wake_word("hey luna") == (True, 1.0, "hey luna")
+
+
+def test_wake_word_must_be_a_whole_word(detector):
+    assert detector.detect_wake_word("the lunar eclipse is tonight") is None
@@ -1,7 +1,7 @@
 #responses/mouth/tone_adaptive_response.py
 import json
 from utils.logger import Logger
-import random
+from random import randrange
 
 from sensors.mouth import Mouth
 # Initialize logger
@@ -18,6 +18,7 @@ class ToneAdaptiveResponse:
         self.tts_engine = tts_engine if tts_engine else Mouth()
         self.tone_responses_file = tone_responses_file
         self.tone_responses = {}
+        self._tone_emotion_map = {}  # (tone, emotion) -> tuple of responses
         self.load_tone_responses()
         logger.info("Initialized ToneAdaptiveResponse with TTS")
 
@@ -25,7 +26,16 @@ class ToneAdaptiveResponse:
         """Load predefined tone responses from a JSON file."""
         try:
             with open(self.tone_responses_file, 'r') as f:
-                self.tone_responses = json.load(f)
+                self.tone_responses = {
+                    tone: {emotion: tuple(responses) for emotion, responses in emotions.items()}
+                    for tone, emotions in json.load(f).items()
+                }
+                # Flatten once so adapt_tone needs a single lookup
+                self._tone_emotion_map = {
+                    (tone, emotion): responses
+                    for tone, emotions in self.tone_responses.items()
+                    for emotion, responses in emotions.items()
+                }
                 logger.info(f"Loaded tone responses from {self.tone_responses_file}")
         except FileNotFoundError:
             logger.error(f"Tone responses file not found: {self.tone_responses_file}")
@@ -41,13 +51,13 @@ class ToneAdaptiveResponse:
         :param emotion: The specific emotion within the tone category (e.g., 'happy', 'sad').
         :return: The adapted response or the original text if no match is found.
         """
-        if tone in self.tone_responses:
-            if emotion in self.tone_responses[tone]:
-                response = random.choice(self.tone_responses[tone][emotion])
-                logger.info(f"Adapted response for tone '{tone}' and emotion '{emotion}': {response}")
-            else:
-                logger.warning(f"Emotion '{emotion}' not found in tone '{tone}'. Using default text.")
-                response = text
+        responses = self._tone_emotion_map.get((tone, emotion))
+        if responses:
+            response = responses[randrange(len(responses))]
+            logger.info(f"Adapted response for tone '{tone}' and emotion '{emotion}': {response}")
+        elif tone in self.tone_responses:
+            logger.warning(f"Emotion '{emotion}' not found in tone '{tone}'. Using default text.")
+            response = text
         else:
             logger.warning(f"Tone '{tone}' not found. Using default text.")
             response = text
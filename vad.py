@@ -1,12 +1,31 @@
 # sensors/ears/vad.py
-import librosa
 import numpy as np
+from numba import njit
 
-from sensors.ears.microphone import MicrophoneInput
+from sensors.ears.microphone import get_microphone
 from utils.logger import Logger
 
 logger = Logger()
 
+
+@njit(cache=True, fastmath=True)
+def _frame_energy_mean(audio, frame_length):
+    """
+    Mean of the per-frame short-term energies in a single pass, with no temporaries.
+    A trailing partial frame counts as a frame of its own.
+    """
+    total = 0.0
+    n_frames = 0
+    for start in range(0, audio.size, frame_length):
+        stop = min(start + frame_length, audio.size)
+        energy = 0.0
+        for i in range(start, stop):
+            energy += audio[i] * audio[i]
+        total += energy / (stop - start)
+        n_frames += 1
+    return total / n_frames if n_frames else np.nan
+
+
 class VoiceActivityDetection:
     def __init__(self, threshold=0.02, sample_rate=16000, frame_duration=0.02):
         """
@@ -21,7 +40,9 @@ class VoiceActivityDetection:
         self.sample_rate = sample_rate
         self.frame_duration = frame_duration  # Frame duration in seconds (default 20ms)
         self.frame_length = int(self.sample_rate * self.frame_duration)  # Frame length in samples
-        self.microphone_input = MicrophoneInput()
+        self.microphone_input = get_microphone()
+        self._scratch = np.empty(self.sample_rate, dtype=np.float32)  # Reused float32 copy of each read (up to 1 s)
+        _frame_energy_mean(np.zeros(16, dtype=np.float32), self.frame_length)  # Compile before the first capture
         logger.info("Voice Activity Detection (VAD) initialized.")
 
     def calculate_short_term_energy(self, audio_frame):
@@ -46,17 +67,17 @@ class VoiceActivityDetection:
         Returns:
             bool: True if voice activity is detected, False otherwise.
         """
-        energy_values = []
-        # Split audio data into frames and calculate short-term energy
-        for i in range(0, len(audio_data), self.frame_length):
-            frame = audio_data[i:i + self.frame_length]
-            if len(frame) == 0:
-                continue
-            energy = self.calculate_short_term_energy(frame)
-            energy_values.append(energy)
-
-        average_energy = np.mean(energy_values)
-        logger.info(f"Calculated average short-term energy: {average_energy:.6f}")
+        audio_data = np.ascontiguousarray(audio_data, dtype=np.float32)
+        if len(audio_data) == 0:
+            return False
+
+        # No frame's energy can exceed the squared peak, so quiet audio is rejected with two reductions
+        peak = max(float(audio_data.max()), -float(audio_data.min()))
+        if peak * peak <= self.threshold:
+            return False
+
+        average_energy = _frame_energy_mean(audio_data, self.frame_length)
+        logger.debug("Calculated average short-term energy: %.6f", average_energy)
 
         return average_energy > self.threshold
 
@@ -65,26 +86,33 @@ class VoiceActivityDetection:
         Continuously monitor for voice activity and log detection results.
         """
         logger.info("Starting advanced VAD...")
+        audio_ring = self.microphone_input.audio_ring
+        audio_ready = audio_ring.subscribe()
+        position = audio_ring.position  # Only audio that arrives from now on is scored
 
         try:
             while True:
-                # Capture audio in real-time from the microphone
-                audio_data = self.microphone_input.capture_audio()
-
-                if len(audio_data) == 0:
-                    logger.warning("No audio data captured.")
+                # Wait for the microphone to deliver new samples, unless a backlog is still being drained
+                if position == audio_ring.position:
+                    if not audio_ready.wait(timeout=0.5):
+                        continue
+                    audio_ready.clear()
+
+                # Copy only the samples written since the last read into the reused float32 buffer
+                samples, position, dropped = audio_ring.read_since(position, out=self._scratch)
+                if dropped:
+                    logger.warning(f"VAD fell behind; skipped {dropped} audio samples.")
+                if len(samples) == 0:
                     continue
+                samples *= 1.0 / 32768.0
 
                 # Detect voice activity
-                if self.detect_voice_activity(librosa.util.buf_to_float(audio_data)):
-                    logger.info("Voice activity detected.")
+                if self.detect_voice_activity(samples):
+                    logger.debug("Voice activity detected.")
                 else:
-                    logger.info("No voice activity detected.")
+                    logger.debug("No voice activity detected.")
         except KeyboardInterrupt:
             logger.info("VAD stopped by user.")
         except Exception as e:
             logger.error(f"Error in VAD: {e}")
-        finally:
-            # Release microphone resources
-            self.microphone_input.release()
 
@@ -9,11 +9,23 @@ from sklearn.pipeline import make_pipeline
 from sklearn.preprocessing import StandardScaler
 from sklearn.svm import SVC
 
-from sensors.ears.microphone import MicrophoneInput
+from sensors.ears.microphone import MicrophoneInput, to_float32
 from utils.logger import Logger
 
+try:
+    import onnxruntime as ort
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+except ImportError:
+    ort = None  # Falls back to scoring with the scikit-learn model
+
 logger = Logger()
 
+FEATURE_CACHE_SUFFIX = '.mfcc.npy'  # Cached MFCC vector stored next to each voice profile
+NEAREST_CENTROID_MAX_USERS = 20  # Up to this many profiles, speakers are matched to the nearest stored feature vector
+NEAREST_PROFILE_MAX_DISTANCE = 40.0  # Distance between mean MFCC vectors at which a speaker no longer matches a profile
+MFCC_HOP_LENGTH = 512  # librosa's default STFT hop, used to count each recording's frames in a batch
+
 class VoiceProfileRecognition:
     def __init__(self, profile_dir='config/voice_profiles', model_path='config/voice_model.pkl', timeout=10):
         """
@@ -25,8 +37,12 @@ class VoiceProfileRecognition:
         self.microphone_input = MicrophoneInput(timeout=timeout)
         self.profile_dir = profile_dir
         self.model_path = model_path
+        self.onnx_path = os.path.splitext(model_path)[0] + '.onnx'  # ONNX export of the trained pipeline
+        self._session = None  # ONNX Runtime session used for authentication when available
         self.model = make_pipeline(StandardScaler(), SVC(kernel='linear', probability=True))
         self.labels = []
+        self._X = None  # Feature matrix the model was last fit on, one row per profile (None until trained)
+        self._y = None  # Numerical labels matching the rows of self._X
 
         logger.info("Voice profile recognition system initialized.")
 
@@ -47,12 +63,18 @@ class VoiceProfileRecognition:
             logger.error(f"Voice profile directory {self.profile_dir} does not exist.")
             return np.array([]), np.array([])
 
+        self.labels = []
+        pending = []  # (index, file path, audio) of profiles without fresh cached features
         for voice_profile_file in os.listdir(self.profile_dir):
+            if voice_profile_file.endswith(FEATURE_CACHE_SUFFIX):
+                continue
             file_path = os.path.join(self.profile_dir, voice_profile_file)
             try:
-                # Load the audio file and extract the MFCC features
-                voice_profile, _ = librosa.load(file_path, sr=16000)
-                mfccs = self.extract_features(voice_profile)
+                mfccs = self.load_cached_features(file_path)
+                if mfccs is None:
+                    # Load the audio file; its MFCC features are extracted below together with the other new profiles
+                    voice_profile, _ = librosa.load(file_path, sr=16000, dtype=np.float32)
+                    pending.append((len(voice_profiles), file_path, voice_profile))
                 voice_profiles.append(mfccs)
                 labels.append(len(labels))  # Assign a numerical label
                 self.labels.append(os.path.splitext(voice_profile_file)[0])  # Store filename without extension as label
@@ -60,8 +82,53 @@ class VoiceProfileRecognition:
             except Exception as e:
                 logger.error(f"Error loading {voice_profile_file}: {str(e)}")
 
+        if pending:
+            features = self.extract_features_batch([voice_profile for _, _, voice_profile in pending])
+            for (index, file_path, _), mfccs in zip(pending, features):
+                voice_profiles[index] = mfccs
+                try:
+                    np.save(file_path + FEATURE_CACHE_SUFFIX, mfccs)
+                except OSError as e:
+                    logger.warning(f"Could not cache features for {file_path}: {str(e)}")
+
         return np.array(voice_profiles), np.array(labels)
 
+    def load_cached_features(self, file_path):
+        """
+        Return the cached MFCC features of a voice profile if the cache is at least as new as the audio.
+        :param file_path: Path to the voice profile audio file.
+        :return: MFCC feature vector (numpy.ndarray), or None if there is no fresh cache
+        """
+        cache_path = file_path + FEATURE_CACHE_SUFFIX
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(file_path):
+            return np.load(cache_path)
+        return None
+
+    def extract_features_batch(self, waveforms):
+        """
+        Extract MFCC features for several recordings at once, matching extract_features for each of them.
+        The STFT and mel filterbank run once over the zero-padded batch; each recording's MFCCs are then
+        taken over its own frames only, so padding does not change the result.
+        :param waveforms: List of raw audio arrays.
+        :return: List of MFCC feature vectors (numpy.ndarray)
+        """
+        try:
+            lengths = [len(waveform) for waveform in waveforms]
+            batch = np.zeros((len(waveforms), max(lengths)), dtype=np.float32)
+            for row, waveform in zip(batch, waveforms):
+                row[:len(waveform)] = waveform
+            spectrograms = librosa.feature.melspectrogram(y=batch, sr=16000, hop_length=MFCC_HOP_LENGTH)
+
+            features = []
+            for spectrogram, length in zip(spectrograms, lengths):
+                frames = 1 + length // MFCC_HOP_LENGTH  # Frame count of the unpadded, centered STFT
+                mfccs = librosa.feature.mfcc(S=librosa.power_to_db(spectrogram[:, :frames]), n_mfcc=13)
+                features.append(np.mean(mfccs.T, axis=0))
+            return features
+        except Exception as e:
+            logger.error(f"Error extracting batched MFCC features: {str(e)}")
+            return [self.extract_features(waveform) for waveform in waveforms]
+
     def extract_features(self, audio_data):
         """
         Extract MFCC features from audio data.
@@ -69,11 +136,13 @@ class VoiceProfileRecognition:
         :return: MFCC feature vector (numpy.ndarray)
         """
         try:
+            # float32 throughout halves the memory traffic of the STFT and mel filterbank
+            audio_data = np.asarray(audio_data, dtype=np.float32)
             mfccs = librosa.feature.mfcc(y=audio_data, sr=16000, n_mfcc=13)
             return np.mean(mfccs.T, axis=0)  # Average MFCC coefficients across frames
         except Exception as e:
             logger.error(f"Error extracting MFCC features: {str(e)}")
-            return np.zeros(13)  # Return a dummy vector in case of error
+            return np.zeros(13, dtype=np.float32)  # Return a dummy vector in case of error
 
     def train_model(self):
         """
@@ -83,6 +152,7 @@ class VoiceProfileRecognition:
             voice_profiles, labels = self.load_voice_profiles()
             if len(voice_profiles) > 0:
                 # Train the SVM model using voice profiles and their labels
+                self._X, self._y = voice_profiles.astype(np.float32), labels
                 self.model.fit(voice_profiles, labels)
                 logger.info("Voice profile model trained successfully.")
                 # Save the trained model
@@ -97,10 +167,35 @@ class VoiceProfileRecognition:
         Save the trained model to disk.
         """
         try:
-            joblib.dump((self.model, self.labels), self.model_path)
+            joblib.dump((self.model, self.labels, self._X, self._y), self.model_path)
             logger.info(f"Model saved to {self.model_path}")
         except Exception as e:
             logger.error(f"Error saving model: {str(e)}")
+            return
+        self.export_onnx()
+
+    def export_onnx(self):
+        """
+        Export the trained pipeline to ONNX and load it into an ONNX Runtime session for authentication.
+        """
+        self._session = None
+        if ort is None:
+            return
+        try:
+            onnx_model = convert_sklearn(self.model, initial_types=[('X', FloatTensorType([None, 13]))],
+                                         options={SVC: {'zipmap': False}})
+            with open(self.onnx_path, 'wb') as f:
+                f.write(onnx_model.SerializeToString())
+            self._load_session()
+            logger.info(f"ONNX model exported to {self.onnx_path}")
+        except Exception as e:
+            logger.warning(f"Could not export the model to ONNX, using scikit-learn: {str(e)}")
+
+    def _load_session(self):
+        """
+        Load the exported ONNX model into an ONNX Runtime session.
+        """
+        self._session = ort.InferenceSession(self.onnx_path, providers=['CPUExecutionProvider'])
 
     def load_model(self):
         """
@@ -109,8 +204,18 @@ class VoiceProfileRecognition:
         """
         if os.path.exists(self.model_path):
             try:
-                self.model, self.labels = joblib.load(self.model_path)
+                saved = joblib.load(self.model_path)
+                self.model, self.labels = saved[:2]
+                if len(saved) > 2:  # Models saved before the feature matrix was stored only hold (model, labels)
+                    self._X, self._y = saved[2:4]
                 logger.info(f"Loaded pre-trained model from {self.model_path}")
+                if ort is not None:
+                    # Reuse the ONNX export unless it predates the pickled model
+                    if os.path.exists(self.onnx_path) and \
+                            os.path.getmtime(self.onnx_path) >= os.path.getmtime(self.model_path):
+                        self._load_session()
+                    else:
+                        self.export_onnx()
                 return True
             except Exception as e:
                 logger.error(f"Error loading model: {str(e)}")
@@ -130,12 +235,15 @@ class VoiceProfileRecognition:
                 return None, 0.0
 
             # Extract features from the captured audio
-            features = self.extract_features(librosa.util.buf_to_float(raw_audio))
+            features = self.extract_features(to_float32(np.frombuffer(raw_audio, dtype=np.int16)))
 
             # Predict the speaker based on extracted features
-            prediction = self.model.predict_proba([features])[0]
-            predicted_label = np.argmax(prediction)
-            confidence = prediction[predicted_label]
+            if self._X is not None and len(self._X) <= NEAREST_CENTROID_MAX_USERS:
+                predicted_label, confidence = self.nearest_profile(features)
+            else:
+                prediction = self.predict_scores(features)
+                predicted_label = int(np.argmax(prediction))
+                confidence = float(prediction[predicted_label])
 
             # Get the predicted user's profile name (file name)
             predicted_user = self.labels[predicted_label]
@@ -146,9 +254,42 @@ class VoiceProfileRecognition:
             logger.error(f"Error during user authentication: {str(e)}")
             return None, 0.0
 
+    def nearest_profile(self, features):
+        """
+        Match a feature vector to the closest stored profile; each profile is already one averaged MFCC vector.
+        The softmax over distances measured in units of NEAREST_PROFILE_MAX_DISTANCE only ranks the profiles,
+        so it is scaled down by how close the nearest one is: a speaker at or beyond the cutoff gets 0, even
+        when a single profile is enrolled.
+        :param features: MFCC feature vector.
+        :return: Predicted label and its confidence
+        """
+        distances = np.linalg.norm(self._X - np.asarray(features, dtype=np.float32), axis=1)
+        distances /= NEAREST_PROFILE_MAX_DISTANCE
+        index = int(np.argmin(distances))
+        weights = np.exp(distances[index] - distances)  # Shifted by the minimum so the exponentials cannot underflow
+        closeness = max(0.0, 1.0 - float(distances[index]))
+        return int(self._y[index]), float(weights[index] / weights.sum()) * closeness
+
+    def predict_scores(self, features):
+        """
+        Per-label confidence for a single feature vector, summing to 1.
+        Uses the ONNX Runtime session when available; otherwise a softmax over the SVM decision values,
+        which skips the Platt scaling of scikit-learn's predict_proba.
+        :param features: MFCC feature vector.
+        :return: Confidence per label (numpy.ndarray)
+        """
+        if self._session is not None:
+            return self._session.run(None, {'X': np.asarray(features, dtype=np.float32)[None]})[1][0]
+        scores = np.atleast_1d(self.model.decision_function([features])[0])
+        if scores.size == 1:
+            scores = np.array([-scores[0], scores[0]])  # Two labels: the decision value favours the second
+        scores = np.exp(scores - scores.max())
+        return scores / scores.sum()
+
     def store_user_data(self, voice_features, user_name):
         """
         Store a new user's voice profile data and re-train the model with the new data.
+        Once the model has been trained, only the new profile's features are computed; the rest are reused.
         :param voice_features: The raw audio data of the user's voice.
         :param user_name: The user's name (label for the voice profile).
         """
@@ -163,7 +304,24 @@ class VoiceProfileRecognition:
             sf.write(profile_path, voice_features, samplerate=16000)
             logger.info(f"Stored new voice profile for {user_name} at {profile_path}")
 
-            # Re-train the model with the new voice profile
-            self.train_model()
+            # Extract the new profile's features once and cache them alongside the audio
+            mfccs = self.extract_features(np.asarray(voice_features, dtype=np.float32))
+            np.save(profile_path + FEATURE_CACHE_SUFFIX, mfccs)
+
+            if self._X is None:
+                # Nothing materialized yet: train from every stored profile
+                self.train_model()
+                return
+
+            # Re-train the model on the in-memory features with the new profile added or replaced
+            if user_name in self.labels:
+                self._X[self.labels.index(user_name)] = mfccs
+            else:
+                self._X = np.vstack([self._X, mfccs])
+                self._y = np.append(self._y, len(self.labels))
+                self.labels.append(user_name)
+            self.model.fit(self._X, self._y)
+            logger.info("Voice profile model retrained with the new profile.")
+            self.save_model()
         except Exception as e:
             logger.error(f"Error storing user data: {str(e)}")
@@ -1,15 +1,43 @@
 # sensors/sensory_inputs/auditory/wake_word_detector.py
 import json
+import os
 import random
 import threading
-from difflib import SequenceMatcher
+from collections import Counter
+
+from rapidfuzz import fuzz
 
 from sensors.ears.microphone import MicrophoneInput
 from sensors.mouth.mouth import Mouth
 from utils.logger import Logger
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None  # Falls back to one substring check per word
+
 logger = Logger()
 
+
+def _is_whole_word(text, start, end):
+    """
+    Whether text[start:end] is not part of a longer word, i.e. the characters around it are not alphanumeric.
+    """
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+
+def _whole_word_spans(text, word):
+    """
+    Yield the (start, end) span of every occurrence of `word` in `text` as a whole word
+    (so "luna" matches "hey luna" but not "lunar").
+    """
+    start = text.find(word)
+    while start != -1:
+        if _is_whole_word(text, start, start + len(word)):
+            yield start, start + len(word)
+        start = text.find(word, start + 1)
+
+
 class WakeWordDetector:
     def __init__(self, microphone_input, config_file='config/react_keys.json', confidence_threshold=0.8):
         """
@@ -22,18 +50,27 @@ class WakeWordDetector:
         """
         self.microphone_input = microphone_input
         self.config_file = config_file
+        self.hits_file = os.path.splitext(config_file)[0] + '_hits.json'  # Persisted per-word detection counts
         self.speak = Mouth()
         self.confidence_threshold = confidence_threshold
-        self.listening = False
-        self.lock = threading.Lock()
+        self._listening = threading.Event()  # Set while wake word detection is running
 
         self.wake_words = []
         self.sleep_words = []
         self.wake_responses = []
         self.sleep_responses = []
+        self._all_words = []  # (normalized word, length, is_wake_word) triples, wake words first
+        self._automaton = None  # Aho-Corasick automaton over all words, mapping each to its index in _all_words
+        self._response_cycles = {}  # is_wake_word -> iterator over a shuffled copy of the matching responses
+        self._word_hits = self.load_hits()  # Detections per word, used to check frequent words first
         self.load_config()  # Load initial config
         logger.info("WakeWordDetector initialized.")
 
+    @property
+    def listening(self):
+        """Whether wake word detection is running."""
+        return self._listening.is_set()
+
     def load_config(self):
         """
         Load wake/sleep words and responses from the configuration JSON file.
@@ -45,6 +82,8 @@ class WakeWordDetector:
                 self.sleep_words = config.get("sleep_words", [])
                 self.wake_responses = config.get("wake_responses", [])
                 self.sleep_responses = config.get("sleep_responses", [])
+                self._prepare_words()
+                self._response_cycles = {}
                 logger.info("Successfully loaded wake and sleep words and responses.")
         except FileNotFoundError:
             logger.error(f"Config file {self.config_file} not found.")
@@ -53,6 +92,32 @@ class WakeWordDetector:
         except Exception as e:
             logger.error(f"Unexpected error loading config file {self.config_file}: {e}", exc_info=True)
 
+    def load_hits(self):
+        """
+        Load the per-word detection counts saved by save_hits.
+
+        Returns:
+            Counter: Detections per normalized word (empty if none were saved).
+        """
+        try:
+            with open(self.hits_file, 'r') as f:
+                return Counter(json.load(f))
+        except FileNotFoundError:
+            return Counter()
+        except Exception as e:
+            logger.warning(f"Could not load wake word hit counts from {self.hits_file}: {e}")
+            return Counter()
+
+    def save_hits(self):
+        """
+        Save the per-word detection counts next to the config so the match order survives restarts.
+        """
+        try:
+            with open(self.hits_file, 'w') as f:
+                json.dump(self._word_hits, f)
+        except Exception as e:
+            logger.warning(f"Could not save wake word hit counts to {self.hits_file}: {e}")
+
     def update_config(self, new_config_data):
         """
         Update the wake/sleep words and responses dynamically.
@@ -64,8 +129,30 @@ class WakeWordDetector:
         self.sleep_words = new_config_data.get("sleep_words", self.sleep_words)
         self.wake_responses = new_config_data.get("wake_responses", self.wake_responses)
         self.sleep_responses = new_config_data.get("sleep_responses", self.sleep_responses)
+        self._prepare_words()
+        self._response_cycles = {}
         logger.info("Wake and sleep words/responses updated dynamically.")
 
+    def _prepare_words(self):
+        """
+        Normalize the wake/sleep words the same way transcripts are and build the combined match list.
+        Within each list, the most frequently detected words come first so matching usually exits on the first word.
+        """
+        hits = self._word_hits
+        self.wake_words = sorted((word.lower().strip() for word in self.wake_words), key=lambda word: -hits[word])
+        self.sleep_words = sorted((word.lower().strip() for word in self.sleep_words), key=lambda word: -hits[word])
+        self._all_words = [(word, len(word), True) for word in self.wake_words] + \
+                          [(word, len(word), False) for word in self.sleep_words]
+
+        self._automaton = None
+        if ahocorasick is not None and any(word for word, _, _ in self._all_words):
+            automaton = ahocorasick.Automaton()
+            for index, (word, _, _) in reversed(list(enumerate(self._all_words))):
+                if word:
+                    automaton.add_word(word, index)  # Reversed so a duplicate word keeps its first index
+            automaton.make_automaton()
+            self._automaton = automaton
+
     def detect_wake_word(self, text):
         """
         Detect if a wake or sleep word is present in the given text.
@@ -77,28 +164,53 @@ class WakeWordDetector:
             tuple: A tuple containing (is_wake_word, confidence, detected_word) or None if no match.
         """
         transcript = text.lower().strip()
-        logger.info(f"Transcript received for wake word detection: {transcript}")
+        logger.debug("Transcript received for wake word detection: %s", transcript)
 
-        # Check for wake words
-        for word in self.wake_words:
-            confidence = self.calculate_confidence(word, transcript)
-            if confidence >= self.confidence_threshold:
-                logger.info(f"Wake word detected: {word} with confidence: {confidence}")
-                response = self.choose_response(self.wake_responses)
-                self.speak.speak(response)
-                return True, confidence, word
-
-        # Check for sleep words
-        for word in self.sleep_words:
-            confidence = self.calculate_confidence(word, transcript)
+        # Fast path: a word that appears verbatim, as a whole word, in the transcript is a certain match
+        if self._automaton is not None:
+            # One scan finds every contained word of both lists
+            hits = [(end + 1 - self._all_words[index][1], end + 1, index)
+                    for end, index in self._automaton.iter(transcript)]
+        else:
+            hits = [(start, end, index) for index, (word, _, _) in enumerate(self._all_words) if word
+                    for start, end in _whole_word_spans(transcript, word)]
+        hits = [hit for hit in hits if _is_whole_word(transcript, hit[0], hit[1])]
+        if hits:
+            # The longest hit wins so a wake word inside a sleep phrase ("luna" in "goodbye luna") is not
+            # mistaken for the phrase; the match order only breaks ties between equally long hits
+            _, _, index = min(hits, key=lambda hit: (hit[0] - hit[1], hit[2]))
+            word, _, is_wake_word = self._all_words[index]
+            return self._on_word_detected(word, is_wake_word, 1.0)
+
+        transcript_length = len(transcript)
+
+        # Fuzzy match for near-misses, wake words first, then sleep words
+        for word, word_length, is_wake_word in self._all_words:
+            # The similarity can be at most 2 * min(len) / (sum of lengths); skip words that cannot reach the threshold
+            total_length = word_length + transcript_length
+            if not total_length or 2 * min(word_length, transcript_length) < self.confidence_threshold * total_length:
+                continue
+            confidence = self.calculate_confidence(word, transcript, score_cutoff=self.confidence_threshold)
             if confidence >= self.confidence_threshold:
-                logger.info(f"Sleep word detected: {word} with confidence: {confidence}")
-                response = self.choose_response(self.sleep_responses)
-                self.speak.speak(response)
-                return False, confidence, word
+                return self._on_word_detected(word, is_wake_word, confidence)
 
         return None
 
+    def _on_word_detected(self, word, is_wake_word, confidence):
+        """
+        Speak a response for a detected wake or sleep word and build the detection result.
+
+        Returns:
+            tuple: (is_wake_word, confidence, detected_word)
+        """
+        self._word_hits[word] += 1
+        if is_wake_word:
+            logger.info(f"Wake word detected: {word} with confidence: {confidence}")
+        else:
+            logger.info(f"Sleep word detected: {word} with confidence: {confidence}")
+        self.speak.speak(self._next_response(is_wake_word))
+        return is_wake_word, confidence, word
+
     def listen_for_wake_word(self, callback):
         """
         Start listening for wake and sleep words, invoking the callback when a match is detected.
@@ -106,31 +218,32 @@ class WakeWordDetector:
         Args:
             callback (function): The callback function to be invoked upon detecting a wake or sleep word.
         """
-        with self.lock:
-            if not self.listening:
-                logger.info("Starting to listen for wake or sleep words...")
-                self.listening = True
+        # MicrophoneInput serializes start/stop itself, so the flag only needs to be an Event
+        if not self._listening.is_set():
+            logger.info("Starting to listen for wake or sleep words...")
+            self._listening.set()
+            self._prepare_words()  # Re-order by the hit counts gathered so far
 
-                def local_callback(transcribed_text):
-                    result = self.detect_wake_word(transcribed_text)
-                    if result is not None:
-                        detected_wake_word, confidence, matched_word = result
-                        callback(detected_wake_word, confidence, matched_word)
+            def local_callback(transcribed_text):
+                result = self.detect_wake_word(transcribed_text)
+                if result is not None:
+                    detected_wake_word, confidence, matched_word = result
+                    callback(detected_wake_word, confidence, matched_word)
 
-                # Start listening using the microphone input with the provided callback
-                self.microphone_input.start_listening(local_callback)
+            # Start listening using the microphone input with the provided callback
+            self.microphone_input.start_listening(local_callback)
 
     def stop_listening(self):
         """
         Stop listening for wake and sleep words.
         """
-        with self.lock:
-            if self.listening:
-                logger.info("Stopping wake word detection...")
-                self.microphone_input.stop_listening()
-                self.listening = False
+        if self._listening.is_set():
+            logger.info("Stopping wake word detection...")
+            self.microphone_input.stop_listening()
+            self._listening.clear()
+            self.save_hits()
 
-    def calculate_confidence(self, word, transcript):
+    def calculate_confidence(self, word, transcript, score_cutoff=0.0):
         """
         Calculate the confidence score for a detected word in the transcript.
         Use a more advanced text matching algorithm to compute similarity.
@@ -138,14 +251,31 @@ class WakeWordDetector:
         Args:
             word (str): The wake or sleep word to check for.
             transcript (str): The transcribed text.
+            score_cutoff (float): Scores below this are reported as 0, letting the scorer stop early.
         
         Returns:
             float: A confidence score between 0 and 1.
         """
-        similarity = SequenceMatcher(None, word, transcript).ratio()  # Higher ratio means better match
-        logger.info(f"Calculated similarity for '{word}' in transcript: {similarity:.2f}")
+        similarity = fuzz.ratio(word, transcript, score_cutoff=score_cutoff * 100) * 0.01  # Higher is a better match
+        logger.debug("Calculated similarity for '%s' in transcript: %.2f", word, similarity)
         return similarity
 
+    def _next_response(self, is_wake_word):
+        """
+        Take the next wake or sleep response from a shuffled cycle, reshuffling once every response has been used.
+
+        Returns:
+            str: The next response, or None if there are no responses.
+        """
+        try:
+            return next(self._response_cycles[is_wake_word])
+        except (KeyError, StopIteration):
+            responses = self.wake_responses if is_wake_word else self.sleep_responses
+            if not responses:
+                return None
+            self._response_cycles[is_wake_word] = iter(random.sample(responses, len(responses)))
+            return next(self._response_cycles[is_wake_word])
+
     def choose_response(self, responses):
         """
         Choose a random response from a list of responses.